@@ -1,79 +1,49 @@
-#!/usr/bin/env python
-import smbus
-import time
-import math
-
-#Local import: i2cutils.py
-from i2cutils import i2c_raspberry_pi_bus_number
-
-bus = smbus.SMBus(1)
-address = 0x1e
-
-def read_byte(adr):
-    return bus.read_byte_data(address, adr)
-
-def read_word(adr):
-    high = bus.read_byte_data(address, adr)
-    low = bus.read_byte_data(address, adr+1)
-    val = (high << 8) + low
-    return val
-
-def read_word_2c(adr):
-    val = read_word(adr)
-    if (val >= 0x8000):
-        return -((65535 - val) + 1)
-    else:
-        return val
-
-def write_byte(adr, value):
-    bus.write_byte_data(address, adr, value)
-
-write_byte(0, 0b01110000) # Set to 8 samples @ 15Hz
-write_byte(1, 0b00100000) # 1.3 gain LSb / Gauss 1090 (default)
-write_byte(2, 0b00000000) # Continuous sampling
-
-minx = 0
-maxx = 0
-miny = 0
-maxy = 0
-minz = 0
-maxz = 0
-
-print "Now repeatedly rotate the hmc5883l around all three axes"
-
-for i in range(0,100):
-    x_out = read_word_2c(3)
-    y_out = read_word_2c(7)
-    z_out = read_word_2c(5)
-    
-    
-    if x_out < minx:
-        minx=x_out
-    
-    if y_out < miny:
-        miny=y_out
-
-    if z_out < minz:
-        minz=z_out
-    
-    if x_out > maxx:
-        maxx=x_out
-    
-    if y_out > maxy:
-        maxy=y_out
-
-    if z_out > maxz:
-        maxz=z_out
-   
-    print ("x: %.0f - %.0f, y: %.0f - %.0f, z: %.0f - %.0f" % (minx, maxx, miny, maxy, minz, maxz) )
-    
-    time.sleep(0.1)
-
-print "results:"
-print ( "x: min, max = %.0f, %.0f" % (minx, maxx) )
-print ( "y: min, max = %.0f, %.0f" % (miny, maxy) )
-print ( "z: min, max = %.0f, %.0f" % (minz, maxz) )
-
-print "x offset: ", (maxx + minx) / 2
-print "y offset: ", (maxy + miny) / 2
-print "z offset: ", (maxz + minz) / 2
+#!/usr/bin/python3
+
+# Hard / soft iron calibration of the HMC5883L.
+# Rotate the board slowly through every orientation while this runs; the
+# readings are fitted to an ellipsoid (gy80.magcal) and the offset and soft
+# iron matrix are saved to the calibration store, where HMC5883L loads
+# them at start-up.
+#
+#     ./3calibrate-hmc5883l.py [seconds]
+
+import sys
+
+from gy80 import HMC5883L, EllipsoidCalibrator, PeriodicScheduler
+
+seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+rate = 15   # Hz, the rate HMC5883L configures the chip for
+
+compass = HMC5883L()
+cal = EllipsoidCalibrator()
+loop = PeriodicScheduler(rate=rate)
+
+print("Now repeatedly rotate the hmc5883l around all three axes")
+
+try:
+    for tick in loop:
+        x_out, y_out, z_out = compass.read_xyz()
+        cal.add(x_out, y_out, z_out)
+
+        if tick % rate == 0:
+            print("x: %.0f - %.0f, y: %.0f - %.0f, z: %.0f - %.0f"
+                  % (cal.min[0], cal.max[0], cal.min[1], cal.max[1], cal.min[2], cal.max[2]))
+        if tick >= seconds * rate:
+            break
+except KeyboardInterrupt:
+    pass
+
+print("results (%d samples):" % cal.count)
+print("min/max offset: x %.1f, y %.1f, z %.1f" % tuple(cal.min_max_offset()))
+
+try:
+    offset, matrix = cal.save(compass.ADDRESS, compass.bus)
+except ValueError as e:
+    print("calibration failed: %s" % e)
+    sys.exit(1)
+
+print("offset: x %.1f, y %.1f, z %.1f" % tuple(offset))
+print("soft iron matrix:")
+for row in matrix:
+    print("    %8.4f %8.4f %8.4f" % tuple(row))
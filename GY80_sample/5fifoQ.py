@@ -0,0 +1,46 @@
+import time
+
+from gy80 import ADXL345, L3G4200D, PeriodicScheduler
+from gy80.fifo import read_batch
+
+RATE = 800
+
+adxl345 = ADXL345()
+gyro = L3G4200D()
+adxl345.setDataRate(RATE)
+gyro.setDataRate(RATE)
+adxl345.startFifo(16)
+gyro.startFifo(16)
+
+loop = PeriodicScheduler(rate=100)
+
+try:
+    t0 = time.time()
+    n_acc = 0
+    n_gyro = 0
+    for tick in loop:
+        acc_batch = read_batch(adxl345)
+        gyro_batch = read_batch(gyro)
+        if acc_batch is not None:
+            n_acc += len(acc_batch.t)
+        if gyro_batch is not None:
+            n_gyro += len(gyro_batch.t)
+
+        if time.time() - t0 >= 1.0:
+            print ("ACC: %d samples/s, GYRO: %d samples/s, gyro overruns = %d"
+                   % (n_acc, n_gyro, gyro.fifo_overruns))
+            if acc_batch is not None:
+                print ("   last acc  = %.3f %.3f %.3f g" % tuple(acc_batch.xyz[-1]))
+            if gyro_batch is not None:
+                print ("   last gyro = %.3f %.3f %.3f dps" % tuple(gyro_batch.xyz[-1]))
+            t0 = time.time()
+            n_acc = 0
+            n_gyro = 0
+
+except KeyboardInterrupt:
+    print("Cleanup")
+    print(loop.report())
+
+finally:
+    adxl345.stopFifo()
+    gyro.stopFifo()
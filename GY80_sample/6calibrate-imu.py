@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+
+# Gyro bias and six-position accelerometer calibration.
+# The results are saved to the calibration store, where L3G4200D and
+# ADXL345 load them at start-up.
+
+from gy80 import ADXL345, L3G4200D, SixPositionCalibration
+
+accel = ADXL345()
+gyro = L3G4200D()
+
+input("Leave the board still and press Enter ")
+while True:
+    try:
+        bias = gyro.calibrateBias()
+        break
+    except ValueError as e:
+        input("%s, press Enter to retry " % e)
+print("gyro bias: x %.3f, y %.3f, z %.3f dps" % tuple(bias))
+
+cal = SixPositionCalibration(accel)
+for position, hint in cal.POSITIONS:
+    while True:
+        input("Place the board %s and press Enter " % hint)
+        try:
+            cal.measure(position)
+            break
+        except ValueError as e:
+            print(e)
+
+gain, offset = cal.save()
+print("accel gain:   x %.4f, y %.4f, z %.4f" % tuple(gain))
+print("accel offset: x %.4f, y %.4f, z %.4f g" % tuple(offset))
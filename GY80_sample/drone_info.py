@@ -1,543 +1,115 @@
-import smbus
-import time
 from math import *
+import time
 
-bus = smbus.SMBus(1);            # 0 for R-Pi Rev. 1, 1 for Rev. 2
-
-# General constants
-EARTH_GRAVITY_MS2    = 9.80665 # m/s2
-STANDARD_PRESSURE    = 1013.25 # hPa
-
-
-# ADXL345
-# the following address is defined by datasheet
-ADXL345_ADDRESS         =    0x53 # I2C address
-
-ADXL345_BW_RATE         =    0x2C # Data rate and power mode control 
-ADXL345_POWER_CTL       =    0x2D # Power-saving features control 
-ADXL345_DATA_FORMAT     =    0x31 # Data format control 
-ADXL345_DATAX0          =    0x32
-ADXL345_DATAX1          =    0x33
-ADXL345_DATAY0          =    0x34
-ADXL345_DATAY1          =    0x35
-ADXL345_DATAZ0          =    0x36
-ADXL345_DATAZ1          =    0x37
-
-# set value
-ADXL345_SCALE_MULTIPLIER= 0.00390625    # G/LSP. 1/256 = 0.00390625
-ADXL345_BW_RATE_100HZ   = 0x0A          # 0A = 0000 1111
-ADXL345_MEASURE         = 0x08          # 08 = 0000 1000
-# ----------------------------------
-
-# L3G4200D
-L3G4200D_ADDRESS        =    0x69
-L3G4200D_CTRL_REG1      =    0x20
-L3G4200D_CTRL_REG4      =    0x23
-L3G4200D_OUT_X_L        =    0x28
-L3G4200D_OUT_X_H        =    0x29
-L3G4200D_OUT_Y_L        =    0x2A
-L3G4200D_OUT_Y_H        =    0x2B
-L3G4200D_OUT_Z_L        =    0x2C
-L3G4200D_OUT_Z_H        =    0x2D
-# ----------------------------------
-
-
-# HMC5883L
-# the following address is defined by datasheet
-#HMC5883L (Magnetometer) constants
-HMC5883L_ADDRESS        =    0x1E  # I2C address
-    
-HMC5883L_CRA            =    0x00  # write CRA(00), Configuration Register A
-HMC5883L_CRB            =    0x01  # write CRB(01), Configuration Register B
-HMC5883L_MR             =    0x02  # write Mode(02)
-HMC5883L_DO_X_H         =    0x03  # Data Output
-HMC5883L_DO_X_L         =    0x04
-HMC5883L_DO_Z_H         =    0x05
-HMC5883L_DO_Z_L         =    0x06
-HMC5883L_DO_Y_H         =    0x07
-HMC5883L_DO_Y_L         =    0x08
-# -----------------------------------
-
-
-# BMP 
-#BMP180 (Barometer) constants
-BMP180_ADDRESS            = 0x77
-
-# Calibration coefficients
-BMP180_AC1                = 0xAA
-BMP180_AC2                = 0xAC
-BMP180_AC3                = 0xAE
-BMP180_AC4                = 0xB0
-BMP180_AC5                = 0xB2
-BMP180_AC6                = 0xB4
-BMP180_B1                = 0xB6 
-BMP180_B2                = 0xB8 
-BMP180_MB                = 0xBA 
-BMP180_MC                = 0xBC 
-BMP180_MD                = 0xBE 
-
-
-class IMU(object):
-
-    def write_byte(self,adr, value):
-        bus.write_byte_data(self.ADDRESS, adr, value)
-    
-    def read_byte(self,adr):
-        return bus.read_byte_data(self.ADDRESS, adr)
-
-    def read_word(self,adr,rf=1):
-        # rf=1 Little Endian Format, rf=0 Big Endian Format
-        if (rf == 1):
-            # acc, gyro 
-            low = self.read_byte(adr)
-            high = self.read_byte(adr+1)
-        else:
-            # compass
-            high = self.read_byte(adr)
-            low = self.read_byte(adr+1)
-        val = (high << 8) + low
-        return val
-
-    def read_word_2c(self,adr,rf=1):
-        val = self.read_word(adr,rf)
-        if(val & (1 << 16 - 1)):
-            return val - (1<<16)
-        else:
-            return val
-
-
-class ADXL345(IMU):
-    
-    ADDRESS = ADXL345_ADDRESS
-    
-    def __init__(self) :
-        #Class Properties
-        self.Xoffset = 0.022
-        self.Yoffset = 0.022
-        self.Zoffset = 0.052
-        self.Xraw = 0.0
-        self.Yraw = 0.0
-        self.Zraw = 0.0
-        self.Xg = 0.0
-        self.Yg = 0.0
-        self.Zg = 0.0
-        self.X = 0.0
-        self.Y = 0.0
-        self.Z = 0.0
-        self.df_value = 0b00001000    # Self test disabled, 4-wire interface
-                                # Full resolution, Range = +/-2g
-        self.Xcalibr = ADXL345_SCALE_MULTIPLIER
-        self.Ycalibr = ADXL345_SCALE_MULTIPLIER
-        self.Zcalibr = ADXL345_SCALE_MULTIPLIER
-
-        self.write_byte(ADXL345_BW_RATE, ADXL345_BW_RATE_100HZ)    # Normal mode, Output data rate = 100 Hz
-        self.write_byte(ADXL345_POWER_CTL, ADXL345_MEASURE)    # Auto Sleep disable
-        self.write_byte(ADXL345_DATA_FORMAT, self.df_value)    
-
-    # RAW readings in LPS
-    def getRawX(self) :
-        self.Xraw = self.read_word_2c(ADXL345_DATAX0)
-        return self.Xraw
-
-    def getRawY(self) :
-        self.Yraw = self.read_word_2c(ADXL345_DATAY0)
-        return self.Yraw
-    
-    def getRawZ(self) :
-        self.Zraw = self.read_word_2c(ADXL345_DATAZ0)
-        return self.Zraw
-
-    # G related readings in g
-    def getXg(self,plf = 1.0) :
-        self.Xg = (self.getRawX() * self.Xcalibr + self.Xoffset) * plf + (1.0 - plf) * self.Xg
-        return self.Xg
-
-    def getYg(self,plf = 1.0) :
-        self.Yg = (self.getRawY() * self.Ycalibr + self.Yoffset) * plf + (1.0 - plf) * self.Yg
-        return self.Yg
-
-    def getZg(self,plf = 1.0) :
-        self.Zg = (self.getRawZ() * self.Zcalibr + self.Zoffset) * plf + (1.0 - plf) * self.Zg
-        return self.Zg
-    
-    # Absolute reading in m/s2
-    def getX(self,plf = 1.0) :
-        self.X = self.getXg(plf) * EARTH_GRAVITY_MS2
-        return self.X
-    
-    def getY(self,plf = 1.0) :
-        self.Y = self.getYg(plf) * EARTH_GRAVITY_MS2
-        return self.Y
-    
-    def getZ(self,plf = 1.0) :
-        self.Z = self.getZg(plf) * EARTH_GRAVITY_MS2
-        return self.Z
-
-    def getPitch(self, pre_pitch, gyro_x) :
-        aX = self.getXg()
-        aY = self.getYg()
-        aZ = self.getZg()
-        try:
-            pitch_now = degrees(atan(-aX/sqrt(pow(aY,2)+pow(aZ,2))))
-            if pre_pitch is None:
-                self.pitch = pitch_now
-            else:
-                self.pitch = (pre_pitch+gyro_x)*0.98 + pitch_now*0.02
-        except:
-            self.pitch = -999
-
-        pre_pitch = self.pitch
-        return self.pitch 
-
-    def getRoll(self, pre_roll, gyro_y) :
-        aX = self.getXg()
-        aY = self.getYg()
-        aZ = self.getZg()
-        try:
-            roll_now = degrees(atan(aY/aZ))
-            if pre_roll is None:
-                self.roll = roll_now
-            else:
-                self.roll = (pre_roll+gyro_y)*0.98 + roll_now*0.02
-        except:
-            self.roll = -999
-
-        pre_roll = self.roll
-        return self.roll
-
-    def getTilt(self):
-        aX = self.getXg()
-        aY = self.getYg()
-        aZ = self.getZg()
-        try:
-            self.tilt = degrees(acos(aZ/sqrt(pow(aX,2)+pow(aY,2)+pow(aZ,2))))
-        except:
-            self.tilt = -999
-        return self.tilt
-
-    def getNorm(self, ax, ay, az):
-        self.norm = sqrt(pow(ax, 2)+pow(ay, 2)+pow(az, 2))
-        return self.norm
-
-
-
-class L3G4200D(IMU):
-    
-    ADDRESS = L3G4200D_ADDRESS
-
-    def __init__(self) :
-        #Class Properties
-        self.Xraw = 0.0
-        self.Yraw = 0.0
-        self.Zraw = 0.0
-        self.X = 0.0
-        self.Y = 0.0
-        self.Z = 0.0
-        self.Xangle = 0.0
-        self.Yangle = 0.0
-        self.Zangle = 0.0
-        self.t0x = None
-        self.t0y = None
-        self.t0z = None
-
-        # set value
-        self.gain_std = 0.00875    # dps/digit
-        
-        self.write_byte(L3G4200D_CTRL_REG1, 0x0F)
-        self.write_byte(L3G4200D_CTRL_REG4, 0x80)
-
-        self.setCalibration()
-
-    def setCalibration(self) :
-        gyr_r = self.read_byte(L3G4200D_CTRL_REG4)
-        
-        self.gain = 2 ** ( gyr_r & 48 >> 4) * self.gain_std
-
-    def getRawX(self):
-        self.Xraw = self.read_word_2c(L3G4200D_OUT_X_L)
-        return self.Xraw
-
-    def getRawY(self):
-        self.Yraw = self.read_word_2c(L3G4200D_OUT_Y_L)
-        return self.Yraw
-
-    def getRawZ(self):
-        self.Zraw = self.read_word_2c(L3G4200D_OUT_Z_L)
-        return self.Zraw
-
-    def getX(self,plf = 1.0):
-        self.X = ( self.getRawX() * self.gain ) * plf + (1.0 - plf) * self.X
-        return self.X
-
-    def getY(self,plf = 1.0):
-        self.Y = ( self.getRawY() * self.gain ) * plf + (1.0 - plf) * self.Y
-        return self.Y
-
-    def getZ(self,plf = 1.0):
-        self.Z = ( self.getRawZ() * self.gain ) * plf + (1.0 - plf) * self.Z
-        return self.Z
-    
-    def getXangle(self,plf = 1.0) :
-        if self.t0x is None : self.t0x = time.time()
-        t1x = time.time()
-        LP = t1x - self.t0x
-        self.t0x = t1x
-        self.Xangle = self.getX(plf) * LP
-        return self.Xangle
-    
-    def getYangle(self,plf = 1.0) :
-        if self.t0y is None : self.t0y = time.time()
-        t1y = time.time()
-        LP = t1y - self.t0y
-        self.t0y = t1y
-        self.Yangle = self.getY(plf) * LP
-        return self.Yangle
-    
-    def getZangle(self,plf = 1.0) :
-        if self.t0z is None : self.t0z = time.time()
-        t1z = time.time()
-        LP = t1z - self.t0z
-        self.t0z = t1z
-        self.Zangle = self.getZ(plf) * LP
-        return self.Zangle
-
-
-class HMC5883L(IMU):
-    
-    ADDRESS = HMC5883L_ADDRESS
-
-    def __init__(self) :
-        #Class Properties
-        self.X = None
-        self.Y = None
-        self.Z = None
-        self.angle = None
-        self.Xoffset = 31
-        self.Yoffset = -97
-        self.Zoffset = -326
-        
-        # Declination Angle
-        self.angle_offset = ( -1 * (4 + (32/60))) / (180 / pi)
-        # Formula: (deg + (min / 60.0)) / (180 / M_PI);
-        # ex: Hsinchu = Magnetic Declination: -4 deg, 32 min
-        # declinationAngle = ( -1 * (4 + (32/60))) / (180 / pi)
-        # http://www.magnetic-declination.com/
-        
-        self.scale = 0.92 # convert bit value(LSB) to gauss. DigitalResolution
-
-        # Configuration Register A
-        self.write_byte(HMC5883L_CRA, 0b01110000)
-
-        # Configuration Register B
-        self.write_byte(HMC5883L_CRB, 0b00100000)
-        
-        # Mode Register
-        self.write_byte(HMC5883L_MR, 0b00000000)
-
-    def getX(self):
-        self.X = (self.read_word_2c(HMC5883L_DO_X_H, rf=0) - self.Xoffset) * self.scale
-        return self.X
-
-    def getY(self):
-        self.Y = (self.read_word_2c(HMC5883L_DO_Y_H, rf=0) - self.Yoffset) * self.scale
-        return self.Y
-
-    def getZ(self):
-        self.Z = (self.read_word_2c(HMC5883L_DO_Z_H, rf=0) - self.Zoffset) * self.scale
-        return self.Z
-    
-    def getHeading(self):
-        bearing  = degrees(atan2(self.getY(), self.getX()))
-
-        if (bearing < 0):
-            bearing += 360
-        if (bearing > 360):
-            bearing -= 360
-        self.angle = bearing + self.angle_offset
-        return self.angle
-
-
-
-class BMP180(IMU):
-    
-    ADDRESS = BMP180_ADDRESS
-    
-    def __init__(self) :
-        #Class Properties
-        self.tempC = None
-        self.tempF = None
-        self.press = None
-        self.altitude = None
-        
-        self.oversampling = 0 
-        
-        self._read_calibratio_params()
-        
-    # read calibration data
-    def _read_calibratio_params(self) :
-        self.ac1_val = self.read_word_2c(BMP180_AC1,0)
-        self.ac2_val = self.read_word_2c(BMP180_AC2,0)
-        self.ac3_val = self.read_word_2c(BMP180_AC3,0)
-        self.ac4_val = self.read_word(BMP180_AC4,0)
-        self.ac5_val = self.read_word(BMP180_AC5,0)
-        self.ac6_val = self.read_word(BMP180_AC6,0)
-        self.b1_val = self.read_word_2c(BMP180_B1,0)
-        self.b2_val = self.read_word_2c(BMP180_B2,0)
-        self.mc_val = self.read_word_2c(BMP180_MC,0)
-        self.md_val = self.read_word_2c(BMP180_MD,0)
-
-    # read uncompensated temperature value
-    def getTempC(self) :
-        # print ("Calculating temperature...")
-        self.write_byte(0xF4, 0x2E)
-        time.sleep(0.005)
-        
-        ut = self.read_word(0xF6,0)
-
-        # calculate true temperature
-        x1 = ((ut - self.ac6_val) * self.ac5_val) >> 15
-        x2 = (self.mc_val << 11) // (x1 + self.md_val)
-        b5 = x1 + x2 
-        self.tempC = ((b5 + 8) >> 4) / 10.0
-        
-        return self.tempC
-
-    def getTempF(self) :
-        #print ("Calculating temperature (Fahrenheit)...")
-        self.tempF = self.getTempC() * 1.8 + 32
-
-        return self.tempF
-
-    # read uncompensated pressure value
-    def getPress(self) :
-        # print ("Calculating temperature...")
-        self.write_byte(0xF4, 0x2E)
-        time.sleep(0.005)
-        
-        ut = self.read_word(0xF6,0)
-
-        x1 = ((ut - self.ac6_val) * self.ac5_val) >> 15
-        x2 = (self.mc_val << 11) // (x1 + self.md_val)
-        b5 = x1 + x2 
-
-        #print ("Calculating pressure...")
-        self.write_byte(0xF4, 0x34 + (self.oversampling << 6))
-        time.sleep(0.04)
-
-        msb = self.read_byte(0xF6)
-        lsb = self.read_byte(0xF7)
-        xsb = self.read_byte(0xF8)
-        
-        up = ((msb << 16) + (lsb << 8) + xsb) >> (8 - self.oversampling)
-
-        # calculate true pressure
-        b6 = b5 - 4000
-        b62 = b6 * b6 >> 12
-        x1 = (self.b2_val * b62) >> 11
-        x2 = self.ac2_val * b6 >> 11
-        x3 = x1 + x2
-        b3 = (((self.ac1_val * 4 + x3) << self.oversampling) + 2) >> 2
-
-        x1 = self.ac3_val * b6 >> 13
-        x2 = (self.b1_val * b62) >> 16
-        x3 = ((x1 + x2) + 2) >> 2
-        b4 = (self.ac4_val * (x3 + 32768)) >> 15
-        b7 = (up - b3) * (50000 >> self.oversampling)
-
-        press = (b7 * 2) // b4
-        #press = (b7 / b4) * 2
-
-        x1 = (press >> 8) * (press >> 8)
-        x1 = (x1 * 3038) >> 16
-        x2 = (-7357 * press) >> 16
-        self.press = ( press + ((x1 + x2 + 3791) >> 4) ) / 100.0
-        
-        return self.press
-
-    # calculate absolute altitude
-    def getAltitude(self) :
-        #    print ("Calculating altitude...")
-        self.altitude = 44330 * (1 - ((self.getPress() / STANDARD_PRESSURE) ** 0.1903))
-        return self.altitude
-
-
-class gy801(object):
-    def __init__(self) :
-        self.accel = ADXL345()
-        self.gyro = L3G4200D()
-        self.compass = HMC5883L()
-        self.baro = BMP180()
-
-pre_roll = None
-pre_pitch = None
+from gy80 import get_bus, SensorSession, Madgwick, SampleClock, PeriodicScheduler, AltitudeFilter
+from gy80.resilient import ResilientBus, SensorGuard
+from gy80.altitude import vertical_acceleration
+from gy80.hmc5883l import tilt_heading
+from gy80.recorder import TelemetryRecorder
+
+RATE = 10
+TELEMETRY_FILE = 'drone_info.ring'     # read back with gy80.recorder.TelemetryReader
+
+# a chip that stops answering is retried, then skipped with backoff and
+# configured again once it is back; meanwhile its last value is reused
+bus = ResilientBus(get_bus())
+
+# every chip has to take its configuration once; until then keep trying
+while True:
+    try:
+        sensors = SensorSession(bus).open()
+        break
+    except (IOError, OSError) as e:
+        print("Waiting for the sensors: %s" % e)
+        time.sleep(0.5)
+
+acc = SensorGuard(sensors.accel)
+gyro = SensorGuard(sensors.gyro)
+compass = SensorGuard(sensors.compass)
+baro = SensorGuard(sensors.baro)
+# a guarded read returns None until the chip has answered once
+baro.getAltitude()      # first reading, afterwards baro.update() never blocks
+mag = None              # only fresh samples, from poll(); the data registers
+                        # hold nothing until the first conversion is done
+declination = degrees(compass.angle_offset)
+
+ahrs = Madgwick(beta=0.1)
+altitude = AltitudeFilter()
+if baro.altitude is not None:
+    altitude.correct(baro.altitude)
+clock = SampleClock(nominal_dt=1.0 / RATE)
+recorder = TelemetryRecorder(TELEMETRY_FILE, capacity=RATE * 3600)
+
+loop = PeriodicScheduler(rate=RATE)
 
 try:
-    while 1:
-        sensors = gy801()
-
-        acc = sensors.accel
-        gyro = sensors.gyro
-        compass = sensors.compass
-        baro = sensors.baro
+    for tick in loop:
+        fresh_baro = baro.update()
 
-        magx = compass.getX()
-        magy = compass.getY()
-        magz = compass.getZ()
+        fresh_mag = compass.poll()
+        if fresh_mag is not None:
+            mag = fresh_mag
 
         # --------------------------------------------------
         # calculate pitch, roll, tilt
-        aX = acc.getX()
-        aY = acc.getY()
-        aZ = acc.getZ()
-
-        gyro_x = gyro.getXangle()
-        gyro_y = gyro.getYangle()
-        
-        roll = acc.getRoll(pre_roll, gyro_y)
-        pitch = acc.getPitch(pre_pitch, gyro_x)
+        a = acc.getXYZ()
+        g = gyro.getXYZ()
+        dt = clock.tick()
+        if a is None or g is None:
+            # no attitude (and nothing to record) before both have answered
+            continue
+        aX, aY, aZ = a
+        gX, gY, gZ = g
+
+        ahrs.update((aX, aY, aZ), (gX, gY, gZ), None, dt)
+        roll, pitch, yaw = ahrs.euler()
+
+        # altitude at the loop rate: integrate the vertical acceleration,
+        # corrected by every new barometer reading
+        altitude.predict(vertical_acceleration(ahrs.quaternion(), (aX, aY, aZ)), dt)
+        if fresh_baro:
+            altitude.correct(baro.altitude)
         # --------------------------------------------------
 
         # --------------------------------------------------
-        # Heading
-        bearing1  = degrees(atan2(magy, magx))
-
-        if (bearing1 < 0):
-            bearing1 += 360
-        if (bearing1 > 360):
-            bearing1 -= 360
-        bearing1 = bearing1 + compass.angle_offset
-        
-        # Tilt compensate
-        compx = magx * cos(pitch) + magz * sin(pitch)
-        compy = magx * sin(roll) * sin(pitch) \
-                + magy * cos(roll) \
-                - magz * sin(roll) * cos(pitch)
-
-        bearing2  = degrees(atan2(compy, compx))
-        if (bearing2 < 0):
-            bearing2 += 360
-        if (bearing2 > 360):
-            bearing2 -= 360
-        bearing2 = bearing2 + compass.angle_offset
+        # Heading, tilt compensated with the fused roll / pitch
+        # (NaN until the compass has answered)
+        bearing1 = bearing2 = nan
+        if mag is not None:
+            magx, magy, magz = mag
+            bearing1 = (degrees(atan2(magy, magx)) + declination) % 360.0
+            bearing2 = tilt_heading(mag, roll, pitch, declination)
         # --------------------------------------------------
 
         #print ("Compass: " )
         #print ("X = %d ," % ( magx ))
         #print ("Y = %d ," % ( magy ))
         #print ("Z = %d (gauss)" % ( magz ))
-        #print ("tiltX = %.3f ," % ( compx ))
-        #print ("tiltY = %.3f ," % ( compy ))
        
         #print ("Angle offset = %.3f deg" % ( compass.angle_offset ))
         #print ("Original Heading = %.3f deg, " % ( bearing1 ))
         #print ("Tilt Heading = %.3f deg, " % ( bearing2 ))
 
-        print("Roll: %.3f, " %(roll)),
-        print("Pitch: %.3f, " %(pitch)),
-        print("Tilt: %.3f, " %(acc.getTilt())),
-        print("Heading: %.3f deg, " %(bearing2)),
-        print("Altitude: %.3f." %(baro.getAltitude()))
-        time.sleep(0.1)
+        tilt = acc.getTilt()
+        # NaN for values that do not exist yet (e.g. no barometer reading)
+        if tilt is None:
+            tilt = nan
+        alt = altitude.altitude if altitude.altitude is not None else nan
+        recorder.record(clock.t_ns, roll, pitch, tilt, bearing2, alt)
+
+        # every tick goes to the recorder, the console only gets one line a second
+        if tick % RATE == 0:
+            stale = [name for name, s in (('accel', acc), ('gyro', gyro), ('compass', compass), ('baro', baro))
+                     if s.stale]
+            print("Roll: %.3f, Pitch: %.3f, Tilt: %.3f, Heading: %.3f deg, Altitude: %.3f.%s"
+                  % (roll, pitch, tilt, bearing2, alt,
+                     " (stale: %s)" % ", ".join(stale) if stale else ""))
 
 except KeyboardInterrupt:
-    print("Cleanup")
\ No newline at end of file
+    print("Cleanup")
+    print(loop.report())
+    print("Loop: %(rate).1f Hz, jitter %(jitter).4f s, %(late)d late ticks" % clock.stats())
+
+finally:
+    recorder.close()
+    sensors.close()
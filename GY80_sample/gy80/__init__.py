@@ -0,0 +1,46 @@
+# GY-80 10DOF board drivers: ADXL345, L3G4200D, HMC5883L and BMP180.
+#
+# Every name below is imported lazily, so a script that only does
+#     from gy80 import BMP180
+# loads the barometer module and nothing else.
+
+import importlib
+
+_LAZY = {
+    'get_bus':   'bus',
+    'set_bus':   'bus',
+    'IMU':       'imu',
+    'ADXL345':   'adxl345',
+    'L3G4200D':  'l3g4200d',
+    'HMC5883L':  'hmc5883l',
+    'BMP180':    'bmp180',
+    'gy801':     'board',
+    'SensorSession': 'session',
+    'Madgwick':  'fusion',
+    'Mahony':    'fusion',
+    'SampleClock': 'timing',
+    'PeriodicScheduler': 'scheduler',
+    'SensorHub': 'hub',
+    'AltitudeFilter': 'altitude',
+    'EllipsoidCalibrator': 'magcal',
+    'GyroBiasTracker': 'imucal',
+    'SixPositionCalibration': 'imucal',
+    'ResilientBus': 'resilient',
+    'SensorGuard': 'resilient',
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,255 @@
+from math import atan, acos, sqrt, degrees
+
+from .constants import EARTH_GRAVITY_MS2
+from .imu import IMU
+from . import imucal
+
+# ADXL345
+# the following address is defined by datasheet
+ADXL345_ADDRESS         =    0x53 # I2C address
+
+ADXL345_BW_RATE         =    0x2C # Data rate and power mode control
+ADXL345_POWER_CTL       =    0x2D # Power-saving features control
+ADXL345_DATA_FORMAT     =    0x31 # Data format control
+ADXL345_DATAX0          =    0x32
+ADXL345_DATAX1          =    0x33
+ADXL345_DATAY0          =    0x34
+ADXL345_DATAY1          =    0x35
+ADXL345_DATAZ0          =    0x36
+ADXL345_DATAZ1          =    0x37
+ADXL345_FIFO_CTL        =    0x38 # FIFO mode and watermark
+ADXL345_FIFO_STATUS     =    0x39 # D5-D0: entries in the FIFO
+
+# set value
+ADXL345_SCALE_MULTIPLIER= 0.00390625    # G/LSP. 1/256 = 0.00390625
+ADXL345_BW_RATE_100HZ   = 0x0A          # 0A = 0000 1010
+ADXL345_LOW_POWER       = 0x10          # BW_RATE D4
+ADXL345_FULL_RES        = 0x08          # DATA_FORMAT D3, 3.9 mg/LSB in every range
+ADXL345_MEASURE         = 0x08          # 08 = 0000 1000
+ADXL345_STANDBY         = 0x00          # measure bit cleared
+ADXL345_FIFO_BYPASS     = 0x00          # D7 D6 = 00
+ADXL345_FIFO_STREAM     = 0x80          # D7 D6 = 10, D4-D0 = watermark
+ADXL345_FIFO_SIZE       = 32
+
+# output data rate (Hz) -> BW_RATE D3-D0
+ADXL345_RATES = {
+    3200: 0x0F, 1600: 0x0E, 800: 0x0D, 400: 0x0C,
+     200: 0x0B,  100: 0x0A,  50: 0x09,  25: 0x08,
+    12.5: 0x07, 6.25: 0x06,
+}
+
+# rates that can run in low power mode (datasheet table 8)
+ADXL345_LOW_POWER_RATES = (12.5, 25, 50, 100, 200, 400)
+
+# range (+/- g) -> DATA_FORMAT D1-D0
+ADXL345_RANGES = {2: 0b00, 4: 0b01, 8: 0b10, 16: 0b11}
+
+
+class ADXL345(IMU):
+
+    ADDRESS = ADXL345_ADDRESS
+    XYZ_REG = ADXL345_DATAX0
+    XYZ_RF = 1
+    XYZ_ORDER = (0, 1, 2)
+
+    def __init__(self, bus=None, rate=100, g_range=2, full_res=True, low_power=False) :
+        IMU.__init__(self, bus)
+        #Class Properties
+        self.Xoffset = 0.022  # unit: G, modify by yourself
+        self.Yoffset = 0.022  # unit: G, modify by yourself
+        self.Zoffset = 0.052  # unit: G, modify by yourself
+        self.Xraw = 0.0
+        self.Yraw = 0.0
+        self.Zraw = 0.0
+        self.Xg = 0.0
+        self.Yg = 0.0
+        self.Zg = 0.0
+        self.X = 0.0
+        self.Y = 0.0
+        self.Z = 0.0
+        self.df_value = 0b00001000    # Self test disabled, 4-wire interface
+                                # Full resolution, Range = +/-2g
+        self.scale = ADXL345_SCALE_MULTIPLIER
+        self.Xcalibr = ADXL345_SCALE_MULTIPLIER
+        self.Ycalibr = ADXL345_SCALE_MULTIPLIER
+        self.Zcalibr = ADXL345_SCALE_MULTIPLIER
+        self.gain = (1.0, 1.0, 1.0)
+        self.rate = 100
+        self.low_power = False
+        self.g_range = 2
+        self.full_res = True
+
+        # six-position calibration (gy80.imucal) replaces the offsets above
+        self.calibrated = False
+        profile = imucal.load('adxl345', self.ADDRESS, self.bus)
+        if profile and 'gain' in profile:
+            self.setCalibration(profile['gain'], profile['offset'])
+
+        self.setDataRate(rate, low_power)
+        self.write_byte(ADXL345_POWER_CTL, ADXL345_MEASURE)    # Auto Sleep disable
+        self.setRange(g_range, full_res)
+
+    def setCalibration(self, gain, offset) :
+        # gain: per axis correction of the nominal scale, offset in g
+        self.gain = tuple(gain)
+        self.Xoffset, self.Yoffset, self.Zoffset = offset
+        self.calibrated = True
+        self._setScale(self.scale)
+
+    def _setScale(self, scale) :
+        self.scale = scale
+        self.Xcalibr = scale * self.gain[0]
+        self.Ycalibr = scale * self.gain[1]
+        self.Zcalibr = scale * self.gain[2]
+
+    def setRange(self, g_range, full_res=True) :
+        # full resolution keeps 3.9 mg/LSB (up to 13 bits) in every range,
+        # otherwise the 10 bit output spans the range
+        if g_range not in ADXL345_RANGES:
+            raise ValueError("unsupported ADXL345 range +/-%rg, use one of %s"
+                             % (g_range, sorted(ADXL345_RANGES)))
+        self.df_value = ADXL345_RANGES[g_range]
+        if full_res:
+            self.df_value |= ADXL345_FULL_RES
+        self.write_byte(ADXL345_DATA_FORMAT, self.df_value)
+        self.g_range = g_range
+        self.full_res = full_res
+        self._setScale(ADXL345_SCALE_MULTIPLIER if full_res else g_range * 2 / 1024.0)
+
+    def reinit(self) :
+        self.setDataRate(self.rate, self.low_power)
+        self.write_byte(ADXL345_POWER_CTL, ADXL345_MEASURE)
+        self.setRange(self.g_range, self.full_res)
+
+    def powerDown(self) :
+        self.write_byte(ADXL345_POWER_CTL, ADXL345_STANDBY)
+
+    def setDataRate(self, rate, low_power=False) :
+        # low power mode trades some noise for current, 12.5 - 400 Hz only
+        if rate not in ADXL345_RATES:
+            raise ValueError("unsupported ADXL345 rate %r Hz, use one of %s"
+                             % (rate, sorted(ADXL345_RATES)))
+        if low_power and rate not in ADXL345_LOW_POWER_RATES:
+            raise ValueError("ADXL345 low power mode needs one of %s Hz"
+                             % (ADXL345_LOW_POWER_RATES,))
+        self.write_byte(ADXL345_BW_RATE, ADXL345_RATES[rate] | (ADXL345_LOW_POWER if low_power else 0))
+        self.rate = rate
+        self.low_power = low_power
+
+    # FIFO, stream mode: the chip keeps the newest 32 samples.
+    # Each 6 byte read of DATAX0..DATAZ1 pops one entry, so the FIFO is
+    # drained with one block read per sample (see gy80.fifo).
+    def startFifo(self, watermark=16) :
+        self.write_byte(ADXL345_FIFO_CTL, ADXL345_FIFO_STREAM | (watermark & 0x1F))
+
+    def stopFifo(self) :
+        self.write_byte(ADXL345_FIFO_CTL, ADXL345_FIFO_BYPASS)
+
+    def fifoCount(self) :
+        return self.read_byte(ADXL345_FIFO_STATUS) & 0x3F
+
+    def readFifo(self, count) :
+        data = bytearray()
+        for i in range(count):
+            data.extend(self.read_block(ADXL345_DATAX0, 6))
+        return data
+
+    # RAW readings in LPS
+    def getRawX(self) :
+        self.Xraw = self.read_word_2c(ADXL345_DATAX0)
+        return self.Xraw
+
+    def getRawY(self) :
+        self.Yraw = self.read_word_2c(ADXL345_DATAY0)
+        return self.Yraw
+
+    def getRawZ(self) :
+        self.Zraw = self.read_word_2c(ADXL345_DATAZ0)
+        return self.Zraw
+
+    def getRawXYZ(self) :
+        self.Xraw, self.Yraw, self.Zraw = self.read_xyz()
+        return self.Xraw, self.Yraw, self.Zraw
+
+    # G related readings in g
+    # similar to filter. combine current value with previous one.
+    # plf = 1 means it only uses "current reading"
+    def getXg(self,plf = 1.0) :
+        self.Xg = (self.getRawX() * self.Xcalibr + self.Xoffset) * plf + (1.0 - plf) * self.Xg
+        return self.Xg
+
+    def getYg(self,plf = 1.0) :
+        self.Yg = (self.getRawY() * self.Ycalibr + self.Yoffset) * plf + (1.0 - plf) * self.Yg
+        return self.Yg
+
+    def getZg(self,plf = 1.0) :
+        self.Zg = (self.getRawZ() * self.Zcalibr + self.Zoffset) * plf + (1.0 - plf) * self.Zg
+        return self.Zg
+
+    def getXYZg(self,plf = 1.0) :
+        xraw, yraw, zraw = self.getRawXYZ()
+        self.Xg = (xraw * self.Xcalibr + self.Xoffset) * plf + (1.0 - plf) * self.Xg
+        self.Yg = (yraw * self.Ycalibr + self.Yoffset) * plf + (1.0 - plf) * self.Yg
+        self.Zg = (zraw * self.Zcalibr + self.Zoffset) * plf + (1.0 - plf) * self.Zg
+        return self.Xg, self.Yg, self.Zg
+
+    # Absolute reading in m/s2
+    def getX(self,plf = 1.0) :
+        self.X = self.getXg(plf) * EARTH_GRAVITY_MS2
+        return self.X
+
+    def getY(self,plf = 1.0) :
+        self.Y = self.getYg(plf) * EARTH_GRAVITY_MS2
+        return self.Y
+
+    def getZ(self,plf = 1.0) :
+        self.Z = self.getZg(plf) * EARTH_GRAVITY_MS2
+        return self.Z
+
+    def getXYZ(self,plf = 1.0) :
+        xg, yg, zg = self.getXYZg(plf)
+        self.X = xg * EARTH_GRAVITY_MS2
+        self.Y = yg * EARTH_GRAVITY_MS2
+        self.Z = zg * EARTH_GRAVITY_MS2
+        return self.X, self.Y, self.Z
+
+    # pre_pitch / pre_roll = None gives the accelerometer-only angle.
+    # -999 marks a reading the angle is undefined for (all zero axes);
+    # bus errors are not caught here, they reach the caller.
+    def getPitch(self, pre_pitch=None, gyro_x=0.0) :
+        aX, aY, aZ = self.getXYZg()
+        try:
+            pitch_now = degrees(atan(-aX/sqrt(pow(aY,2)+pow(aZ,2))))
+            if pre_pitch is None:
+                self.pitch = pitch_now
+            else:
+                self.pitch = (pre_pitch+gyro_x)*0.98 + pitch_now*0.02
+        except (ZeroDivisionError, ValueError):
+            self.pitch = -999
+
+        return self.pitch
+
+    def getRoll(self, pre_roll=None, gyro_y=0.0) :
+        aX, aY, aZ = self.getXYZg()
+        try:
+            roll_now = degrees(atan(aY/aZ))
+            if pre_roll is None:
+                self.roll = roll_now
+            else:
+                self.roll = (pre_roll+gyro_y)*0.98 + roll_now*0.02
+        except (ZeroDivisionError, ValueError):
+            self.roll = -999
+
+        return self.roll
+
+    def getTilt(self):
+        aX, aY, aZ = self.getXYZg()
+        try:
+            self.tilt = degrees(acos(aZ/sqrt(pow(aX,2)+pow(aY,2)+pow(aZ,2))))
+        except (ZeroDivisionError, ValueError):
+            self.tilt = -999
+        return self.tilt
+
+    def getNorm(self, ax, ay, az):
+        self.norm = sqrt(pow(ax, 2)+pow(ay, 2)+pow(az, 2))
+        return self.norm
@@ -0,0 +1,172 @@
+# asyncio front end for the board's sensors.
+#
+# One event loop can multiplex every sensor instead of one thread per
+# device. All I2C traffic goes through a single worker thread (the bus is
+# one shared resource anyway), waits that the old drivers spend in
+# time.sleep() become asyncio.sleep(), and GPIO edge timing is event
+# driven:
+#
+#     async def main():
+#         imu = AsyncIMU(ADXL345())
+#         baro = AsyncBMP180(BMP180())
+#         print(await imu.read_xyz(), await baro.pressure())
+#         async for sample in imu.stream(100):
+#             ...
+#
+# Bit-banged devices (dht11.DHT11) have microsecond timing that only a
+# thread can keep; AsyncDHT11 runs them on their own worker so they never
+# hold up the I2C worker or the loop.
+
+import asyncio
+import concurrent.futures
+import time
+
+_i2c_executor = None
+
+
+def i2c_executor():
+    # the one worker thread that talks to the I2C bus
+    global _i2c_executor
+    if _i2c_executor is None:
+        _i2c_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='gy80-i2c')
+    return _i2c_executor
+
+
+def run_i2c(func, *args):
+    return asyncio.get_running_loop().run_in_executor(i2c_executor(), func, *args)
+
+
+class AsyncIMU(object):
+    # ADXL345 / L3G4200D / HMC5883L: await read_xyz() or stream(rate)
+
+    def __init__(self, sensor) :
+        self.sensor = sensor
+
+    async def read_raw(self) :
+        return await run_i2c(self.sensor.read_xyz)
+
+    async def read_xyz(self) :
+        # engineering units: g for the accelerometer, dps for the gyro,
+        # scaled counts for the compass
+        read = getattr(self.sensor, 'getXYZg', None) or self.sensor.getXYZ
+        return await run_i2c(read)
+
+    async def stream(self, rate) :
+        # async generator of (t_ns, xyz) at a fixed cadence; missed
+        # deadlines are skipped rather than bunched up
+        loop = asyncio.get_running_loop()
+        period = 1.0 / rate
+        deadline = loop.time()
+        while True:
+            xyz = await self.read_xyz()
+            yield time.monotonic_ns(), xyz
+            deadline += period
+            now = loop.time()
+            if deadline < now:
+                deadline += int((now - deadline) / period + 1) * period
+            await asyncio.sleep(deadline - now)
+
+
+class AsyncBMP180(object):
+    # Drives BMP180.update(), the driver's own conversion state machine
+    # (including its temp_interval reuse of b5), and awaits the conversion
+    # times in between, so other sensors are served while the BMP180
+    # converts.
+
+    def __init__(self, sensor, temp_interval=None) :
+        self.sensor = sensor
+        if temp_interval is not None:
+            sensor.temp_interval = temp_interval
+        self._lock = asyncio.Lock()
+
+    async def update(self) :
+        # one non-blocking BMP180.update(); True when press / altitude are new
+        return await run_i2c(self.sensor.update)
+
+    async def pressure(self) :
+        # hPa, from a conversion started by this call
+        async with self._lock:
+            s = self.sensor
+            # a conversion left over from an earlier call may be long done
+            s.reinit()
+            while not await self.update():
+                await asyncio.sleep(s.readyIn())
+            return s.press
+
+    async def temperature(self) :
+        # C; refreshed with the pressure every temp_interval readings
+        await self.pressure()
+        return self.sensor.tempC
+
+    async def altitude(self) :
+        await self.pressure()
+        return self.sensor.altitude
+
+
+class AsyncDHT11(object):
+    # dht11.DHT11 on its own thread; await read() -> DHT11Result
+
+    def __init__(self, dht) :
+        self.dht = dht
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='gy80-dht11')
+
+    async def read(self) :
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.dht.read)
+
+
+class AsyncUltrasonic(object):
+    # HC-SR04 style ranger with edge-triggered echo timing. The echo edges
+    # are timestamped in the RPi.GPIO callback thread and handed to the
+    # loop, so the loop never busy-waits on the echo pin as
+    # ultrasonic.measure() does.
+    #
+    #     ranger = AsyncUltrasonic(GPIO, trigger_pin=16, echo_pin=18)
+    #     cm = await ranger.measure()
+
+    def __init__(self, gpio, trigger_pin, echo_pin, temperature=25, timeout=0.05) :
+        self.gpio = gpio
+        self.trigger_pin = trigger_pin
+        self.echo_pin = echo_pin
+        self.v = 331 + 0.6 * temperature        # m/s
+        self.timeout = timeout
+        self._loop = None
+        self._rise = None
+        self._future = None
+        gpio.setup(trigger_pin, gpio.OUT)
+        gpio.setup(echo_pin, gpio.IN)
+        gpio.add_event_detect(echo_pin, gpio.BOTH, callback=self._edge)
+
+    def _edge(self, channel) :
+        # runs in the RPi.GPIO thread
+        t = time.monotonic()
+        if self.gpio.input(self.echo_pin):
+            self._rise = t
+        elif self._rise is not None and self._future is not None:
+            pulse = t - self._rise
+            self._rise = None
+            self._loop.call_soon_threadsafe(self._resolve, pulse)
+
+    def _resolve(self, pulse) :
+        if self._future is not None and not self._future.done():
+            self._future.set_result(pulse)
+
+    async def measure(self) :
+        # distance in cm, None if no echo came back in time
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
+        self._rise = None
+        self.gpio.output(self.trigger_pin, self.gpio.HIGH)
+        await asyncio.sleep(0.00001)
+        self.gpio.output(self.trigger_pin, self.gpio.LOW)
+        try:
+            pulse = await asyncio.wait_for(self._future, self.timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._future = None
+        return pulse * self.v / 2 * 100
+
+    def close(self) :
+        self.gpio.remove_event_detect(self.echo_pin)
@@ -0,0 +1,105 @@
+# Altitude / vertical speed estimation from the barometer and accelerometer.
+#
+# The BMP180 altitude is noisy (about 1 m at oversampling 0) and only
+# arrives at the baro rate. AltitudeFilter is a three state Kalman filter
+# (altitude, vertical speed, accelerometer bias) that integrates the
+# earth-frame vertical acceleration at the IMU rate and is pulled back to
+# the barometer whenever a new altitude arrives:
+#
+#     alt = AltitudeFilter()
+#     while 1:
+#         fresh = baro.update()
+#         ahrs.update(acc.getXYZ(), gyro.getXYZ(), None, dt)
+#         alt.predict(vertical_acceleration(ahrs.quaternion(), acc.getXYZ()), dt)
+#         if fresh:
+#             alt.correct(baro.altitude)
+#
+# The covariance is kept as six plain floats (it is symmetric), so both
+# steps are a fixed handful of multiplications.
+
+from .constants import EARTH_GRAVITY_MS2
+
+
+def vertical_acceleration(q, acc, gravity=EARTH_GRAVITY_MS2):
+    # earth-frame upward acceleration with gravity removed, same unit as
+    # acc (m/s2 by default; pass gravity=1.0 for readings in g).
+    # q is the (w, x, y, z) attitude from QuaternionFilter.quaternion();
+    # the third row of its rotation matrix is the "up" axis in the body frame.
+    q0, q1, q2, q3 = q
+    ax, ay, az = acc
+    return (2.0 * (q1 * q3 - q0 * q2) * ax
+            + 2.0 * (q0 * q1 + q2 * q3) * ay
+            + (q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3) * az) - gravity
+
+
+class AltitudeFilter(object):
+    # accel_noise: white vertical acceleration noise, m/s2
+    # bias_noise:  accelerometer bias random walk, m/s2 per sqrt(s)
+    # baro_noise:  altitude noise of one BMP180 reading, m
+
+    def __init__(self, accel_noise=0.5, bias_noise=0.02, baro_noise=1.0) :
+        self.accel_var = accel_noise * accel_noise
+        self.bias_var = bias_noise * bias_noise
+        self.baro_var = baro_noise * baro_noise
+        self.reset()
+
+    def reset(self, altitude=None) :
+        self.altitude = altitude
+        self.velocity = 0.0
+        self.bias = 0.0
+        # covariance: p00 altitude, p11 velocity, p22 bias
+        self.p00 = self.baro_var
+        self.p01 = 0.0
+        self.p02 = 0.0
+        self.p11 = 1.0
+        self.p12 = 0.0
+        self.p22 = 0.1
+
+    def predict(self, accel, dt) :
+        # accel: earth-frame vertical acceleration, m/s2, gravity removed
+        if self.altitude is None:
+            return None
+        a = accel - self.bias
+        h2 = 0.5 * dt * dt
+        self.altitude += self.velocity * dt + a * h2
+        self.velocity += a * dt
+
+        p00, p01, p02, p11, p12, p22 = self.p00, self.p01, self.p02, self.p11, self.p12, self.p22
+        # P = F P F' + Q, F = [[1, dt, -dt^2/2], [0, 1, -dt], [0, 0, 1]]
+        a00 = p00 + dt * p01 - h2 * p02
+        a01 = p01 + dt * p11 - h2 * p12
+        a02 = p02 + dt * p12 - h2 * p22
+        a11 = p11 - dt * p12
+        a12 = p12 - dt * p22
+        q = self.accel_var
+        self.p00 = a00 + dt * a01 - h2 * a02 + h2 * h2 * q
+        self.p01 = a01 - dt * a02 + h2 * dt * q
+        self.p02 = a02
+        self.p11 = a11 - dt * a12 + dt * dt * q
+        self.p12 = a12
+        self.p22 = p22 + self.bias_var * dt
+        return self.altitude
+
+    def correct(self, altitude) :
+        # one barometer altitude, m
+        if self.altitude is None:
+            self.reset(altitude)
+            return self.altitude
+        p00, p01, p02 = self.p00, self.p01, self.p02
+        s = p00 + self.baro_var
+        k0 = p00 / s
+        k1 = p01 / s
+        k2 = p02 / s
+        y = altitude - self.altitude
+        self.altitude += k0 * y
+        self.velocity += k1 * y
+        self.bias += k2 * y
+
+        # P = (I - K H) P
+        self.p11 -= k1 * p01
+        self.p12 -= k1 * p02
+        self.p22 -= k2 * p02
+        self.p00 -= k0 * p00
+        self.p01 -= k0 * p01
+        self.p02 -= k0 * p02
+        return self.altitude
@@ -0,0 +1,110 @@
+# Vectorised versions of ADXL345.getPitch/getRoll/getTilt,
+# HMC5883L.getHeading, QuaternionFilter.euler and the BMP180
+# compensation over whole recordings.
+#
+# acc and mag are (N, 3) arrays (columns X, Y, Z; acc in g or m/s2, mag in
+# any unit). All angles are returned in degrees as (N,) float arrays.
+# Samples the scalar methods would report as -999 (pitch with aY = aZ = 0,
+# roll with aZ = 0, tilt of an all-zero vector) come back as NaN here.
+
+import numpy as np
+
+from .constants import STANDARD_PRESSURE
+from .hmc5883l import tilt_compensate
+
+
+def _columns(a):
+    a = np.asarray(a, dtype=np.float64)
+    return a[:, 0], a[:, 1], a[:, 2]
+
+
+def pitch(acc):
+    # same as degrees(atan(-aX / sqrt(aY^2 + aZ^2)))
+    ax, ay, az = _columns(acc)
+    horizontal = np.hypot(ay, az)
+    out = np.degrees(np.arctan2(-ax, horizontal))
+    out[horizontal == 0] = np.nan
+    return out
+
+
+def roll(acc):
+    # same as degrees(atan(aY / aZ))
+    ax, ay, az = _columns(acc)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.degrees(np.arctan(ay / az))
+    out[az == 0] = np.nan
+    return out
+
+
+def tilt(acc):
+    # angle between the Z axis and gravity
+    ax, ay, az = _columns(acc)
+    norm = np.sqrt(ax * ax + ay * ay + az * az)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.degrees(np.arccos(az / norm))
+
+
+def attitude(acc):
+    # (pitch, roll, tilt) in one pass
+    return pitch(acc), roll(acc), tilt(acc)
+
+
+def _wrap360(bearing):
+    return np.mod(bearing, 360.0)
+
+
+def heading(mag, pitch_deg=None, roll_deg=None, declination=0.0):
+    # Heading plus the declination (both in degrees), in [0, 360).
+    # With pitch_deg / roll_deg (degrees, e.g. from euler()) the
+    # magnetometer vector is first rotated back to the horizontal plane,
+    # as hmc5883l.tilt_heading does for one sample in drone_info.py.
+    mx, my, mz = _columns(mag)
+    if pitch_deg is None or roll_deg is None:
+        return _wrap360(np.degrees(np.arctan2(my, mx)) + declination)
+
+    p = np.radians(pitch_deg)
+    r = np.radians(roll_deg)
+    compx, compy = tilt_compensate(mx, my, mz, np.sin(r), np.cos(r), np.sin(p), np.cos(p))
+    return _wrap360(np.degrees(np.arctan2(compy, compx)) + declination)
+
+
+def euler(q):
+    # QuaternionFilter.euler() over (N, 4) quaternions (w, x, y, z):
+    # (roll, pitch, yaw) arrays in degrees
+    q = np.asarray(q, dtype=np.float64)
+    q0, q1, q2, q3 = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    roll = np.arctan2(2.0 * (q0 * q1 + q2 * q3), 1.0 - 2.0 * (q1 * q1 + q2 * q2))
+    pitch = np.arcsin(np.clip(2.0 * (q0 * q2 - q3 * q1), -1.0, 1.0))
+    yaw = np.arctan2(2.0 * (q0 * q3 + q1 * q2), 1.0 - 2.0 * (q2 * q2 + q3 * q3))
+    return np.degrees(roll), np.degrees(pitch), np.degrees(yaw)
+
+
+def baro(sensor, ut, up):
+    # BMP180 compensation of arrays of raw UT / UP readings (logged with
+    # the sensor's current oversampling). Same integer arithmetic as
+    # BMP180._computeB5 / _computePress, so the results are bit for bit
+    # equal. Returns (temperature C, pressure hPa, altitude m) arrays.
+    s = sensor
+    oss = s.oversampling
+    ut = np.asarray(ut, dtype=np.int64)
+    up = np.asarray(up, dtype=np.int64)
+
+    x1 = ((ut - s.ac6_val) * s.ac5_val) >> 15
+    x2 = (s.mc_val << 11) // (x1 + s.md_val)
+    b5 = x1 + x2
+    temp = ((b5 + 8) >> 4) / 10.0
+
+    b6 = b5 - 4000
+    b62 = b6 * b6 >> 12
+    x3 = ((s.b2_val * b62) >> 11) + (s.ac2_val * b6 >> 11)
+    b3 = (((s.ac1_val * 4 + x3) << oss) + 2) >> 2
+    x3 = ((s.ac3_val * b6 >> 13) + ((s.b1_val * b62) >> 16) + 2) >> 2
+    b4 = (s.ac4_val * (x3 + 32768)) >> 15
+    b7 = (up - b3) * (50000 >> oss)
+    press = (b7 * 2) // b4
+
+    x1 = (press >> 8) * (press >> 8)
+    x1 = (x1 * 3038) >> 16
+    x2 = (-7357 * press) >> 16
+    press = (press + ((x1 + x2 + 3791) >> 4)) / 100.0
+    return temp, press, 44330 * (1 - (press / STANDARD_PRESSURE) ** 0.1903)
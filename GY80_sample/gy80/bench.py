@@ -0,0 +1,298 @@
+# Throughput / latency benchmarks for the GY-80 drivers and fusion code.
+#
+# The drivers run against the simulated bus (gy80.sim) with an injectable
+# per-transaction and per-byte latency, so the numbers are comparable
+# between machines and versions; the fusion filters run on a recorded
+# dataset (CSV with ax,ay,az,gx,gy,gz[,mx,my,mz] columns) or on data
+# generated by the simulator.
+#
+#     python -m gy80.bench                          # human readable table
+#     python -m gy80.bench --latency 150e-6 --json new.json
+#     python -m gy80.bench --compare old.json       # flag regressions
+#
+# For every stage it reports samples/s, p50 / p99 step latency and the net
+# number of Python heap blocks a step leaves allocated (sys.getallocatedblocks,
+# so garbage that is freed again within the step does not count).
+#
+# Each stage is timed in --repeats passes. samples/s is the best pass (the
+# one least disturbed by the rest of the system) and the spread between the
+# passes is kept as the stage's noise; --compare only reports a slow-down
+# as a regression if it exceeds both the threshold and that noise.
+
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+from .bus import set_bus
+from .sim import SimBus, Wobble
+
+BENCH_VERSION = 2
+
+# stage name -> what is timed
+STAGES = (
+    'read_axes_single',     # getX/getY/getZ on accel, gyro and compass (18 transactions)
+    'read_axes_burst',      # getXYZ on accel, gyro and compass (3 transactions)
+    'accel_angles',         # getPitch + getRoll + getTilt
+    'baro_blocking',        # BMP180.getAltitude() with its sleeps
+    'baro_update',          # BMP180.update() in the loop (non blocking)
+    'print',                # the five drone_info.py print calls, to /dev/null
+    'madgwick',             # Madgwick.update() with magnetometer
+    'mahony',               # Mahony.update() with magnetometer
+    'loop',                 # one drone_info.py style tick without printing
+)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def measure(step, n, warmup=10, transactions=None, repeats=5):
+    # time n calls of step(), repeats times; returns the result dict of one
+    # stage. transactions: optional function returning the bus transaction count
+    for i in range(min(warmup, n)):
+        step()
+
+    # allocation pass, kept apart from the timing pass whose own int
+    # objects would otherwise show up as allocations
+    blocks0 = sys.getallocatedblocks()
+    for i in range(n):
+        step()
+    blocks = sys.getallocatedblocks() - blocks0
+
+    times = [0] * (n * repeats)
+    rates = []
+    clock = time.perf_counter_ns
+    xfers0 = transactions() if transactions else 0
+    j = 0
+    for r in range(repeats):
+        t_start = clock()
+        for i in range(n):
+            t0 = clock()
+            step()
+            times[j] = clock() - t0
+            j += 1
+        total = clock() - t_start
+        rates.append(n / (total * 1e-9) if total else 0.0)
+    xfers = (transactions() - xfers0) if transactions else 0
+    times.sort()
+    rates.sort()
+    median = percentile(rates, 50)
+    return {
+        'n': n,
+        'repeats': repeats,
+        'samples_per_s': rates[-1],
+        'samples_per_s_median': median,
+        'noise': (rates[-1] - rates[0]) / median if median else 0.0,
+        'p50_us': percentile(times, 50) * 1e-3,
+        'p99_us': percentile(times, 99) * 1e-3,
+        'alloc_blocks_per_step': float(blocks) / n,
+        'transactions_per_step': float(xfers) / (n * repeats),
+    }
+
+
+def load_dataset(path):
+    # CSV with a header naming ax,ay,az,gx,gy,gz and optionally mx,my,mz
+    acc, gyro, mag = [], [], []
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            acc.append((float(row['ax']), float(row['ay']), float(row['az'])))
+            gyro.append((float(row['gx']), float(row['gy']), float(row['gz'])))
+            if 'mx' in row:
+                mag.append((float(row['mx']), float(row['my']), float(row['mz'])))
+    return acc, gyro, (mag or None)
+
+
+def synthetic_dataset(n, seed=0):
+    # n samples of a wobbling board from the simulator, read at full speed
+    from .adxl345 import ADXL345
+    from .l3g4200d import L3G4200D
+    from .hmc5883l import HMC5883L
+    bus = SimBus(motion=Wobble(roll=20, pitch=10, yaw=30, freq=1.0), seed=seed)
+    acc_dev, gyro_dev, mag_dev = ADXL345(bus), L3G4200D(bus), HMC5883L(bus)
+    acc, gyro, mag = [], [], []
+    for i in range(n):
+        acc.append(acc_dev.getXYZg())
+        gyro.append(gyro_dev.getXYZ())
+        mag.append(mag_dev.getXYZ())
+    return acc, gyro, mag
+
+
+def run(iterations=2000, latency=0.0, byte_time=0.0, dataset=None, stages=STAGES, seed=0, repeats=5):
+    from .adxl345 import ADXL345
+    from .l3g4200d import L3G4200D
+    from .hmc5883l import HMC5883L
+    from .bmp180 import BMP180
+    from .fusion import Madgwick, Mahony
+
+    bus = SimBus(motion=Wobble(roll=20, pitch=10, freq=1.0), latency=latency,
+                 byte_time=byte_time, seed=seed)
+    set_bus(bus)
+    acc, gyro, compass, baro = ADXL345(bus), L3G4200D(bus), HMC5883L(bus), BMP180(bus)
+    baro.getAltitude()
+
+    if dataset:
+        data_acc, data_gyro, data_mag = load_dataset(dataset)
+    else:
+        data_acc, data_gyro, data_mag = synthetic_dataset(iterations, seed)
+    if data_mag is None:
+        data_mag = [None] * len(data_acc)
+    n_data = len(data_acc)
+
+    def fusion_step(ahrs):
+        state = {'i': 0}
+
+        def step():
+            i = state['i']
+            ahrs.update(data_acc[i], data_gyro[i], data_mag[i], 0.00125)
+            state['i'] = (i + 1) % n_data
+        return step
+
+    devnull = open(os.devnull, 'w')
+
+    def read_axes_single():
+        acc.getX(); acc.getY(); acc.getZ()
+        gyro.getX(); gyro.getY(); gyro.getZ()
+        compass.getX(); compass.getY(); compass.getZ()
+
+    def read_axes_burst():
+        acc.getXYZ()
+        gyro.getXYZ()
+        compass.getXYZ()
+
+    def accel_angles():
+        acc.getPitch()
+        acc.getRoll()
+        acc.getTilt()
+
+    def do_print():
+        print("Roll: %.3f, " % (1.0), file=devnull)
+        print("Pitch: %.3f, " % (2.0), file=devnull)
+        print("Tilt: %.3f, " % (3.0), file=devnull)
+        print("Heading: %.3f deg, " % (4.0), file=devnull)
+        print("Altitude: %.3f." % (5.0), file=devnull)
+
+    loop_ahrs = Madgwick()
+
+    def loop():
+        baro.update()
+        m = compass.getXYZ()
+        a = acc.getXYZ()
+        g = gyro.getXYZ()
+        loop_ahrs.update(a, g, m, 0.005)
+        loop_ahrs.euler()
+
+    table = {
+        'read_axes_single': (read_axes_single, iterations),
+        'read_axes_burst': (read_axes_burst, iterations),
+        'accel_angles': (accel_angles, iterations),
+        'baro_blocking': (baro.getAltitude, max(10, iterations // 100)),
+        'baro_update': (baro.update, iterations),
+        'print': (do_print, iterations),
+        'madgwick': (fusion_step(Madgwick()), iterations * 5),
+        'mahony': (fusion_step(Mahony()), iterations * 5),
+        'loop': (loop, iterations),
+    }
+
+    results = {}
+    for name in stages:
+        step, n = table[name]
+        results[name] = measure(step, n, transactions=lambda: bus.transactions, repeats=repeats)
+    devnull.close()
+
+    return {
+        'bench_version': BENCH_VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'config': {
+            'iterations': iterations,
+            'repeats': repeats,
+            'latency': latency,
+            'byte_time': byte_time,
+            'dataset': dataset or 'synthetic',
+        },
+        'results': results,
+    }
+
+
+def format_results(report):
+    out = io.StringIO()
+    cfg = report['config']
+    out.write("python %s %s, latency %.0f us + %.0f us/byte, dataset %s\n"
+              % (report['python'], report['machine'], cfg['latency'] * 1e6,
+                 cfg['byte_time'] * 1e6, cfg['dataset']))
+    out.write("%-18s %12s %7s %10s %10s %8s %8s\n"
+              % ('stage', 'samples/s', 'noise', 'p50 us', 'p99 us', 'blocks', 'xfers'))
+    for name, r in report['results'].items():
+        out.write("%-18s %12.0f %6.1f%% %10.1f %10.1f %8.2f %8.1f\n"
+                  % (name, r['samples_per_s'], r.get('noise', 0.0) * 100, r['p50_us'], r['p99_us'],
+                     r['alloc_blocks_per_step'], r['transactions_per_step']))
+    return out.getvalue()
+
+
+def compare(old, new, threshold=0.10):
+    # lines describing the change per stage; regressions are marked with !.
+    # A stage only regresses if it slowed down by more than threshold and
+    # by more than the pass-to-pass noise measured in either run.
+    lines = []
+    regressed = False
+    for name, r in new['results'].items():
+        if name not in old.get('results', {}):
+            continue
+        before = old['results'][name]['samples_per_s']
+        after = r['samples_per_s']
+        if not before:
+            continue
+        change = (after - before) / before
+        noise = max(old['results'][name].get('noise', 0.0), r.get('noise', 0.0))
+        mark = ''
+        if change < -max(threshold, noise):
+            mark = '  !'
+            regressed = True
+        lines.append("%-18s %12.0f -> %12.0f  %+6.1f%%%s" % (name, before, after, change * 100, mark))
+    return lines, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GY-80 driver and fusion benchmarks")
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=5, help="timed passes per stage, the best one counts")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per I2C transaction")
+    parser.add_argument('--byte-time', type=float, default=0.0, help="seconds per I2C byte")
+    parser.add_argument('--dataset', help="CSV with ax,ay,az,gx,gy,gz[,mx,my,mz] for the fusion stages")
+    parser.add_argument('--stage', action='append', choices=STAGES, help="run only these stages")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="earlier --json output to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="slow-down reported as regression")
+    args = parser.parse_args(argv)
+
+    report = run(args.iterations, args.latency, args.byte_time, args.dataset,
+                 tuple(args.stage) if args.stage else STAGES, repeats=args.repeats)
+    print(format_results(report))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        lines, regressed = compare(old, report, args.threshold)
+        print("\n".join(lines))
+        if regressed:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
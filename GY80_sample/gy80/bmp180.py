@@ -0,0 +1,260 @@
+import struct
+import time
+
+from . import store
+from .constants import STANDARD_PRESSURE
+from .imu import IMU
+
+# BMP
+#BMP180 (Barometer) constants
+BMP180_ADDRESS            = 0x77
+
+# Calibration coefficients
+BMP180_AC1                = 0xAA
+BMP180_AC2                = 0xAC
+BMP180_AC3                = 0xAE
+BMP180_AC4                = 0xB0
+BMP180_AC5                = 0xB2
+BMP180_AC6                = 0xB4
+BMP180_B1                 = 0xB6
+BMP180_B2                 = 0xB8
+BMP180_MB                 = 0xBA
+BMP180_MC                 = 0xBC
+BMP180_MD                 = 0xBE
+BMP180_CALIB_LEN          = 22      # AC1 .. MD, 11 big endian words
+
+BMP180_CONTROL            = 0xF4
+BMP180_DATA               = 0xF6    # MSB, LSB, XLSB
+BMP180_CMD_TEMP           = 0x2E
+BMP180_CMD_PRESS          = 0x34    # + (oversampling << 6)
+
+# conversion time in s (datasheet max + margin), pressure by oversampling
+BMP180_TEMP_WAIT          = 0.005
+BMP180_PRESS_WAIT         = {0: 0.005, 1: 0.008, 2: 0.014, 3: 0.026}
+
+# update() states
+BMP180_IDLE               = 0
+BMP180_CONV_TEMP          = 1
+BMP180_CONV_PRESS         = 2
+
+# AC1-AC3 signed, AC4-AC6 unsigned, B1, B2, MB, MC, MD signed
+_CALIB_FORMAT = '>hhhHHHhhhhh'
+
+_INV_STANDARD_PRESSURE = 1.0 / STANDARD_PRESSURE
+
+# calibration words already read in this process, keyed by chip
+_calibration_cache = {}
+
+
+class BMP180(IMU):
+
+    ADDRESS = BMP180_ADDRESS
+
+    def __init__(self, bus=None) :
+        IMU.__init__(self, bus)
+        #Class Properties
+        self.tempC = None
+        self.tempF = None
+        self.press = None
+        self.altitude = None
+
+        self.oversampling = 0
+
+        # non-blocking conversion state, see update()
+        self.b5 = None
+        self.temp_interval = 10     # pressure reads per temperature read
+        self._state = BMP180_IDLE
+        self._ready_at = 0.0
+        self._press_count = 0
+
+        self._terms_key = None
+        self._read_calibratio_params()
+
+    # read calibration data
+    # The 11 words never change, so they are read once per process and also
+    # kept in the calibration store. A stored copy is only trusted if AC1
+    # still matches the chip on the bus.
+    def _read_calibratio_params(self) :
+        key = store.chip_key('bmp180', self.ADDRESS, self.bus)
+        params = _calibration_cache.get(key)
+        if params is None:
+            stored = store.get('bmp180', key)
+            if stored is not None and self._read_ac1() == stored[0]:
+                params = tuple(stored)
+            else:
+                params = struct.unpack(_CALIB_FORMAT,
+                    bytes(bytearray(self.read_block(BMP180_AC1, BMP180_CALIB_LEN))))
+                store.put('bmp180', key, list(params))
+            _calibration_cache[key] = params
+
+        (self.ac1_val, self.ac2_val, self.ac3_val,
+         self.ac4_val, self.ac5_val, self.ac6_val,
+         self.b1_val, self.b2_val, self.mb_val,
+         self.mc_val, self.md_val) = params
+
+        # calibration-only terms of the compensation
+        self._mc_shifted = self.mc_val << 11
+        self._ac1_x4 = self.ac1_val * 4
+        self._terms_key = None
+
+    def _read_ac1(self) :
+        return struct.unpack('>h', bytes(bytearray(self.read_block(BMP180_AC1, 2))))[0]
+
+    # ---- compensation (datasheet integer algorithm) ----
+    def _computeB5(self, ut) :
+        x1 = ((ut - self.ac6_val) * self.ac5_val) >> 15
+        x2 = self._mc_shifted // (x1 + self.md_val)
+        return x1 + x2
+
+    # b3 and b4 only depend on the temperature (b5) and the oversampling,
+    # and b5 changes only every temp_interval pressure readings, so they
+    # are computed once per temperature reading instead of per pressure.
+    def _pressTerms(self, b5) :
+        key = (b5, self.oversampling)
+        if key != self._terms_key:
+            oss = self.oversampling
+            b6 = b5 - 4000
+            b62 = b6 * b6 >> 12
+            x1 = (self.b2_val * b62) >> 11
+            x2 = self.ac2_val * b6 >> 11
+            x3 = x1 + x2
+            b3 = (((self._ac1_x4 + x3) << oss) + 2) >> 2
+
+            x1 = self.ac3_val * b6 >> 13
+            x2 = (self.b1_val * b62) >> 16
+            x3 = ((x1 + x2) + 2) >> 2
+            b4 = (self.ac4_val * (x3 + 32768)) >> 15
+            self._terms = (b3, b4, 50000 >> oss)
+            self._terms_key = key
+        return self._terms
+
+    def _computePress(self, up, b5) :
+        b3, b4, step = self._pressTerms(b5)
+        b7 = (up - b3) * step
+
+        press = (b7 * 2) // b4
+        #press = (b7 / b4) * 2
+
+        x1 = (press >> 8) * (press >> 8)
+        x1 = (x1 * 3038) >> 16
+        x2 = (-7357 * press) >> 16
+        return ( press + ((x1 + x2 + 3791) >> 4) ) / 100.0
+
+    # ---- raw conversions ----
+    def _startTemp(self) :
+        self.write_byte(BMP180_CONTROL, BMP180_CMD_TEMP)
+        return BMP180_TEMP_WAIT
+
+    def _readUT(self) :
+        data = self.read_block(BMP180_DATA, 2)
+        return (data[0] << 8) + data[1]
+
+    def _startPress(self) :
+        self.write_byte(BMP180_CONTROL, BMP180_CMD_PRESS + (self.oversampling << 6))
+        return BMP180_PRESS_WAIT[self.oversampling]
+
+    def _readUP(self) :
+        msb, lsb, xsb = self.read_block(BMP180_DATA, 3)
+        return ((msb << 16) + (lsb << 8) + xsb) >> (8 - self.oversampling)
+
+    def _setTemp(self, b5) :
+        self.b5 = b5
+        self.tempC = ((b5 + 8) >> 4) / 10.0
+        return self.tempC
+
+    # read uncompensated temperature value
+    def getTempC(self) :
+        # print ("Calculating temperature...")
+        time.sleep(self._startTemp())
+        return self._setTemp(self._computeB5(self._readUT()))
+
+    def getTempF(self) :
+        #print ("Calculating temperature (Fahrenheit)...")
+        self.tempF = self.getTempC() * 1.8 + 32
+
+        return self.tempF
+
+    # read uncompensated pressure value
+    def getPress(self) :
+        self.getTempC()
+
+        #print ("Calculating pressure...")
+        time.sleep(self._startPress())
+        self.press = self._computePress(self._readUP(), self.b5)
+
+        return self.press
+
+    # calculate absolute altitude
+    def getAltitude(self) :
+        #    print ("Calculating altitude...")
+        self.altitude = self.toAltitude(self.getPress())
+        return self.altitude
+
+    # the international barometric formula; a single pow() is cheaper in
+    # CPython than an interpolated lookup table
+    def toAltitude(self, press) :
+        return 44330 * (1 - ((press * _INV_STANDARD_PRESSURE) ** 0.1903))
+
+    # ---- non-blocking conversion scheduler ----
+    # Call update() once per loop tick. It never sleeps: it starts a
+    # conversion, returns straight away while the chip is busy, and collects
+    # the result on a later tick once the conversion time has passed. The
+    # next conversion is started as soon as one is collected, so the
+    # barometer runs back to back at its own rate.
+    #
+    # The temperature (b5) is only refreshed every temp_interval pressure
+    # readings; it changes far slower than the pressure.
+    #
+    # update() returns True when self.press / self.altitude were refreshed.
+    def update(self, now=None) :
+        if now is None:
+            now = time.monotonic()
+
+        if self._state == BMP180_IDLE:
+            self._startNext(now)
+            return False
+
+        if now < self._ready_at:
+            return False
+
+        if self._state == BMP180_CONV_TEMP:
+            self._setTemp(self._computeB5(self._readUT()))
+            self._press_count = 0
+            self._startNext(now)
+            return False
+
+        # BMP180_CONV_PRESS
+        self.press = self._computePress(self._readUP(), self.b5)
+        self.altitude = self.toAltitude(self.press)
+        self._press_count += 1
+        self._startNext(now)
+        return True
+
+    def readyIn(self, now=None) :
+        # seconds until update() can collect the conversion in flight,
+        # 0 if it can do something right away
+        if self._state == BMP180_IDLE:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, self._ready_at - now)
+
+    def _startNext(self, now) :
+        if self.b5 is None or self._press_count >= self.temp_interval:
+            self._state = BMP180_CONV_TEMP
+            self._ready_at = now + self._startTemp()
+        else:
+            self._state = BMP180_CONV_PRESS
+            self._ready_at = now + self._startPress()
+
+    def reinit(self) :
+        # nothing to configure, but a conversion in flight is lost
+        self._state = BMP180_IDLE
+
+    def setOversampling(self, oversampling) :
+        # 0 = ultra low power .. 3 = ultra high resolution
+        if oversampling not in BMP180_PRESS_WAIT:
+            raise ValueError("oversampling must be 0-3, got %r" % (oversampling,))
+        self.oversampling = oversampling
+        # a conversion in flight was started with the old setting
+        self._state = BMP180_IDLE
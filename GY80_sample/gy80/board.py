@@ -0,0 +1,12 @@
+from .adxl345 import ADXL345
+from .l3g4200d import L3G4200D
+from .hmc5883l import HMC5883L
+from .bmp180 import BMP180
+
+
+class gy801(object):
+    def __init__(self, bus=None) :
+        self.accel = ADXL345(bus)
+        self.gyro = L3G4200D(bus)
+        self.compass = HMC5883L(bus)
+        self.baro = BMP180(bus)
@@ -0,0 +1,54 @@
+# One I2C bus handle per process.
+#
+# Every driver asks get_bus() for the bus instead of opening its own
+# smbus.SMBus(1) at import time, so importing a driver never touches the
+# hardware and all chips share a single file descriptor.
+#
+# The backend is pluggable: anything with the smbus methods used by the
+# drivers (read_byte_data, write_byte_data, read_i2c_block_data) works.
+# GY80_BUS=sim in the environment selects the register level simulator in
+# gy80.sim, so every script runs off-Pi:
+#
+#     GY80_BUS=sim python drone_info.py
+#
+# GY80_BUS_METRICS=<port> wraps the bus in gy80.busstats.InstrumentedBus
+# and serves its statistics over HTTP.
+
+import os
+
+BUS_NUMBER = 1            # 0 for R-Pi Rev. 1, 1 for Rev. 2
+
+_bus = None
+
+
+def open_bus(kind=None):
+    # 'smbus' (default) or 'sim'
+    if kind is None:
+        kind = os.environ.get('GY80_BUS', 'smbus')
+    if kind == 'sim':
+        from .sim import SimBus
+        return SimBus()
+    if kind == 'smbus':
+        import smbus
+        return smbus.SMBus(BUS_NUMBER)
+    raise ValueError("unknown bus backend %r" % (kind,))
+
+
+def get_bus():
+    global _bus
+    if _bus is None:
+        _bus = open_bus()
+        port = os.environ.get('GY80_BUS_METRICS')
+        if port:
+            # I2C statistics on http://<host>:<port>/metrics, see gy80.busstats
+            from .busstats import InstrumentedBus
+            _bus = InstrumentedBus(_bus)
+            _bus.serve(int(port))
+    return _bus
+
+
+def set_bus(bus):
+    # install another bus object (anything with the smbus methods)
+    global _bus
+    _bus = bus
+    return _bus
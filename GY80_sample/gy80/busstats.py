@@ -0,0 +1,251 @@
+# I2C bus instrumentation.
+#
+# InstrumentedBus wraps any bus (smbus.SMBus, SimBus, LockedBus, ...) and
+# keeps, per device address, the number of transactions and bytes, NACKs
+# and other I/O errors, retries reported by a retrying layer above it, and
+# a latency histogram for every register that is read:
+#
+#     bus = set_bus(InstrumentedBus(open_bus()))
+#     ...
+#     print(bus.summary())          # table per device / register
+#     bus.prometheus()              # Prometheus text exposition format
+#     bus.serve(9180)               # http://pi:9180/metrics
+#     bus.report_every(10.0)        # summary to stderr every 10 s
+#
+# GY80_BUS_METRICS=<port> in the environment makes get_bus() wrap the bus
+# and serve the metrics on that port, so any script can be inspected
+# without changing it.
+
+import errno
+from bisect import bisect_left
+import sys
+import threading
+import time
+
+# upper edges of the latency histogram buckets, in us
+LATENCY_BINS_US = (50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# errno values smbus raises when a device does not acknowledge
+NACK_ERRNOS = (errno.EREMOTEIO, errno.ENXIO)
+
+
+class Histogram(object):
+
+    def __init__(self, bins=LATENCY_BINS_US) :
+        self.bins = bins
+        self.counts = [0] * (len(bins) + 1)      # last one is +Inf
+        self.count = 0
+        self.total = 0.0                         # us
+        self.max = 0.0
+
+    def observe(self, us) :
+        self.counts[bisect_left(self.bins, us)] += 1
+        self.count += 1
+        self.total += us
+        if us > self.max:
+            self.max = us
+
+    def mean(self) :
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p) :
+        # upper bucket edge holding the p-th percentile (max for +Inf)
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100.0
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.bins[i] if i < len(self.bins) else self.max
+        return self.max
+
+
+class DeviceStats(object):
+
+    def __init__(self, address) :
+        self.address = address
+        self.transactions = 0
+        self.reads = 0
+        self.writes = 0
+        self.bytes = 0
+        self.nacks = 0
+        self.errors = 0
+        self.retries = 0
+        self.last_error = None
+        self.read_latency = {}      # register -> Histogram
+
+
+class InstrumentedBus(object):
+
+    def __init__(self, bus, bins=LATENCY_BINS_US) :
+        self.bus = bus
+        self.bins = bins
+        self.devices = {}
+        self.started = time.monotonic()
+        self._reporter = None
+        self._server = None
+
+    def _device(self, address) :
+        dev = self.devices.get(address)
+        if dev is None:
+            dev = self.devices.setdefault(address, DeviceStats(address))
+        return dev
+
+    def _failed(self, dev, e) :
+        if getattr(e, 'errno', None) in NACK_ERRNOS:
+            dev.nacks += 1
+        else:
+            dev.errors += 1
+        dev.last_error = e
+
+    def _read(self, address, register, nbytes, call, *args) :
+        dev = self._device(address)
+        dev.transactions += 1
+        dev.reads += 1
+        t0 = time.perf_counter_ns()
+        try:
+            value = call(address, register, *args)
+        except (IOError, OSError) as e:
+            self._failed(dev, e)
+            raise
+        us = (time.perf_counter_ns() - t0) * 1e-3
+        dev.bytes += nbytes
+        hist = dev.read_latency.get(register)
+        if hist is None:
+            hist = dev.read_latency.setdefault(register, Histogram(self.bins))
+        hist.observe(us)
+        return value
+
+    def _write(self, address, register, nbytes, call, *args) :
+        dev = self._device(address)
+        dev.transactions += 1
+        dev.writes += 1
+        try:
+            call(address, register, *args)
+        except (IOError, OSError) as e:
+            self._failed(dev, e)
+            raise
+        dev.bytes += nbytes
+
+    # ---- smbus interface ----
+    def read_byte_data(self, address, register) :
+        return self._read(address, register, 1, self.bus.read_byte_data)
+
+    def write_byte_data(self, address, register, value) :
+        self._write(address, register, 1, self.bus.write_byte_data, value)
+
+    def read_i2c_block_data(self, address, register, length=32) :
+        return self._read(address, register, length, self.bus.read_i2c_block_data, length)
+
+    def write_i2c_block_data(self, address, register, data) :
+        self._write(address, register, len(data), self.bus.write_i2c_block_data, data)
+
+    def close(self) :
+        self.stop()
+        if hasattr(self.bus, 'close'):
+            self.bus.close()
+
+    def retry(self, address) :
+        # called by a retrying layer each time it repeats a transaction
+        self._device(address).retries += 1
+
+    # ---- export ----
+    def summary(self) :
+        elapsed = time.monotonic() - self.started
+        lines = ["I2C bus, %.1f s" % elapsed]
+        lines.append("  %-6s %9s %8s %9s %6s %6s %7s" % ('addr', 'xfers', 'xfer/s', 'bytes', 'nacks', 'errors', 'retries'))
+        for address in sorted(self.devices):
+            d = self.devices[address]
+            lines.append("  0x%02x   %9d %8.0f %9d %6d %6d %7d"
+                         % (address, d.transactions, d.transactions / elapsed if elapsed else 0.0,
+                            d.bytes, d.nacks, d.errors, d.retries))
+            for register in sorted(d.read_latency):
+                h = d.read_latency[register]
+                lines.append("         reg 0x%02x: %7d reads, mean %7.1f us, p99 <= %6.0f us, max %7.1f us"
+                             % (register, h.count, h.mean(), h.percentile(99), h.max))
+        return "\n".join(lines)
+
+    def prometheus(self) :
+        out = []
+        counters = (
+            ('transactions', 'I2C transactions'),
+            ('bytes', 'bytes transferred'),
+            ('nacks', 'transactions not acknowledged by the device'),
+            ('errors', 'other I/O errors'),
+            ('retries', 'transactions repeated by a retrying layer'),
+        )
+        for name, text in counters:
+            out.append("# HELP gy80_i2c_%s_total %s" % (name, text))
+            out.append("# TYPE gy80_i2c_%s_total counter" % name)
+            for address in sorted(self.devices):
+                out.append('gy80_i2c_%s_total{address="0x%02x"} %d'
+                           % (name, address, getattr(self.devices[address], name)))
+
+        out.append("# HELP gy80_i2c_read_latency_seconds register read latency")
+        out.append("# TYPE gy80_i2c_read_latency_seconds histogram")
+        for address in sorted(self.devices):
+            d = self.devices[address]
+            for register in sorted(d.read_latency):
+                h = d.read_latency[register]
+                labels = 'address="0x%02x",register="0x%02x"' % (address, register)
+                cumulative = 0
+                for edge, c in zip(self.bins, h.counts):
+                    cumulative += c
+                    out.append('gy80_i2c_read_latency_seconds_bucket{%s,le="%g"} %d'
+                               % (labels, edge * 1e-6, cumulative))
+                out.append('gy80_i2c_read_latency_seconds_bucket{%s,le="+Inf"} %d' % (labels, h.count))
+                out.append('gy80_i2c_read_latency_seconds_sum{%s} %.9f' % (labels, h.total * 1e-6))
+                out.append('gy80_i2c_read_latency_seconds_count{%s} %d' % (labels, h.count))
+        return "\n".join(out) + "\n"
+
+    def report_every(self, interval, out=None) :
+        # background thread writing summary() every interval seconds
+        out = out if out is not None else sys.stderr
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                out.write(self.summary() + "\n")
+                out.flush()
+
+        t = threading.Thread(target=run, name='gy80-busstats')
+        t.daemon = True
+        t.start()
+        self._reporter = stop
+        return t
+
+    def serve(self, port, host='') :
+        # /metrics over HTTP in a background thread
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        stats = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = stats.prometheus().encode('ascii')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = HTTPServer((host, port), Handler)
+        t = threading.Thread(target=self._server.serve_forever, name='gy80-metrics')
+        t.daemon = True
+        t.start()
+        return self._server
+
+    def stop(self) :
+        if self._reporter is not None:
+            self._reporter.set()
+            self._reporter = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,3 @@
+# General constants
+EARTH_GRAVITY_MS2    = 9.80665 # m/s2
+STANDARD_PRESSURE    = 1013.25 # hPa
@@ -0,0 +1,43 @@
+# Decoding of register blocks into signed 16 bit words.
+#
+# The GY-80 chips put their samples out as two's complement words, little
+# endian on the ADXL345 / L3G4200D (rf=1) and big endian on the HMC5883L
+# (rf=0). Instead of assembling every word from two bytes in Python, a
+# whole block is converted in one call: struct for single samples,
+# numpy.frombuffer with an endian specific dtype for FIFO dumps.
+#
+#     word(data, rf=1)                  # one int from two register bytes
+#     xyz(data, rf=1)                   # (x, y, z) ints from one 6 byte read
+#     samples(fifo_bytes, rf=1)         # (N, 3) int16 array
+
+import struct
+
+# 3 words of one sample by rf flag
+_XYZ = {1: struct.Struct('<3h'), 0: struct.Struct('>3h')}
+_WORD = {1: struct.Struct('<h'), 0: struct.Struct('>h')}
+
+# numpy dtype strings by rf flag
+DTYPES = {1: '<i2', 0: '>i2'}
+
+
+def word(data, rf=1, offset=0):
+    # one signed word
+    return _WORD[rf].unpack_from(bytes(data), offset)[0]
+
+
+def xyz(data, rf=1, order=(0, 1, 2)):
+    # (x, y, z) of one 6 byte sample; order gives the position of X, Y, Z
+    # in the register block (the HMC5883L has them as X, Z, Y)
+    w = _XYZ[rf].unpack(bytes(data))
+    if order == (0, 1, 2):
+        return w
+    return w[order[0]], w[order[1]], w[order[2]]
+
+
+def samples(data, rf=1, order=(0, 1, 2)):
+    # (N, 3) native int16 array of the N samples in a FIFO dump
+    import numpy as np
+    raw = np.frombuffer(bytes(data), dtype=DTYPES[rf]).reshape(-1, 3)
+    if order != (0, 1, 2):
+        raw = raw[:, list(order)]
+    return raw.astype(np.int16)
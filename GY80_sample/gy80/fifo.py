@@ -0,0 +1,70 @@
+# Hardware FIFO streaming for the ADXL345 and L3G4200D.
+#
+# Both chips buffer up to 32 samples on chip. stream() puts the chip in
+# FIFO stream mode and drains it in bulk block reads, so the Python loop
+# only wakes up a few times per watermark instead of once per sample:
+#
+#     acc = ADXL345()
+#     acc.setDataRate(800)
+#     for batch in stream(acc, watermark=16):
+#         batch.t      # (N,)   int64, time.monotonic_ns() of each sample
+#         batch.raw    # (N, 3) int16, raw counts
+#         batch.xyz    # (N, 3) float, g (accel) or dps (gyro)
+
+import collections
+import time
+
+import numpy as np
+
+from . import decode
+
+FifoBatch = collections.namedtuple('FifoBatch', 't raw xyz')
+
+
+def units(sensor, raw):
+    # raw counts -> g for the ADXL345 (calibr + offset), dps for the
+    # L3G4200D (gain - bias), scaled counts for the HMC5883L (offset and
+    # soft iron matrix); the same arithmetic as the drivers' getXYZ
+    if hasattr(sensor, 'matrix'):
+        offset = np.array((sensor.Xoffset, sensor.Yoffset, sensor.Zoffset))
+        return (raw - offset).dot(np.array(sensor.matrix).T)
+    if hasattr(sensor, 'Xbias'):
+        return raw * sensor.gain - np.array((sensor.Xbias, sensor.Ybias, sensor.Zbias))
+    return (raw * np.array((sensor.Xcalibr, sensor.Ycalibr, sensor.Zcalibr))
+            + np.array((sensor.Xoffset, sensor.Yoffset, sensor.Zoffset)))
+
+
+def read_batch(sensor):
+    # drain whatever is in the FIFO right now, None if it is empty
+    count = sensor.fifoCount()
+    if not count:
+        return None
+    data = sensor.readFifo(count)
+    t_last = time.monotonic_ns()
+
+    raw = decode.samples(data, sensor.XYZ_RF, sensor.XYZ_ORDER)
+    # samples are evenly spaced at the output data rate, the newest one
+    # was taken just before the drain finished
+    period_ns = int(1e9 / sensor.rate)
+    t = t_last - period_ns * np.arange(count - 1, -1, -1, dtype=np.int64)
+    return FifoBatch(t, raw, units(sensor, raw))
+
+
+def stream(sensor, watermark=16, max_batches=None):
+    # generator of FifoBatch, leaves the FIFO in bypass mode when closed
+    sensor.startFifo(watermark)
+    # poll at about half the time the FIFO takes to reach the watermark
+    poll = 0.5 * watermark / float(sensor.rate)
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            batch = read_batch(sensor)
+            if batch is None:
+                time.sleep(poll)
+                continue
+            batches += 1
+            yield batch
+            if len(batch.t) < watermark:
+                time.sleep(poll)
+    finally:
+        sensor.stopFifo()
@@ -0,0 +1,323 @@
+# Quaternion attitude filters (Madgwick and Mahony) for the GY-80.
+#
+# Both keep their state between calls, so one filter object lives for the
+# whole loop:
+#
+#     ahrs = Madgwick(beta=0.1)
+#     while 1:
+#         ahrs.update(acc.getXYZg(), gyro.getXYZ(), compass.getXYZ(), dt)
+#         roll, pitch, yaw = ahrs.euler()
+#
+# acc in any unit (only the direction is used), gyro in dps as returned by
+# L3G4200D.getXYZ(), mag in any unit or None. update() works on plain
+# floats held in attributes and local variables; it builds no lists or
+# arrays, so it is cheap enough for the 800 Hz gyro rate.
+#
+# run() is the batch mode for recorded data: it feeds (N, 3) arrays
+# through update() and returns the (N, 4) quaternions (w, x, y, z).
+
+from math import sqrt, atan2, asin, degrees, radians
+
+DEG2RAD = radians(1.0)
+
+
+class QuaternionFilter(object):
+
+    def __init__(self) :
+        self.reset()
+
+    def reset(self) :
+        self.q0 = 1.0
+        self.q1 = 0.0
+        self.q2 = 0.0
+        self.q3 = 0.0
+
+    def quaternion(self) :
+        return self.q0, self.q1, self.q2, self.q3
+
+    def euler(self) :
+        # (roll, pitch, yaw) in degrees
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+        roll = atan2(2.0 * (q0 * q1 + q2 * q3), 1.0 - 2.0 * (q1 * q1 + q2 * q2))
+        s = 2.0 * (q0 * q2 - q3 * q1)
+        if s > 1.0:
+            s = 1.0
+        elif s < -1.0:
+            s = -1.0
+        pitch = asin(s)
+        yaw = atan2(2.0 * (q0 * q3 + q1 * q2), 1.0 - 2.0 * (q2 * q2 + q3 * q3))
+        return degrees(roll), degrees(pitch), degrees(yaw)
+
+    def update(self, acc, gyro, mag=None, dt=0.01) :
+        ax, ay, az = acc
+        gx, gy, gz = gyro
+        gx *= DEG2RAD
+        gy *= DEG2RAD
+        gz *= DEG2RAD
+        if mag is None:
+            self._updateIMU(gx, gy, gz, ax, ay, az, dt)
+            return
+        mx, my, mz = mag
+        if mx == 0.0 and my == 0.0 and mz == 0.0:
+            self._updateIMU(gx, gy, gz, ax, ay, az, dt)
+        else:
+            self._updateMARG(gx, gy, gz, ax, ay, az, mx, my, mz, dt)
+
+    def run(self, acc, gyro, mag=None, dt=0.01) :
+        # batch mode, dt is a constant or a (N,) array of intervals
+        import numpy as np
+        acc = np.asarray(acc, dtype=np.float64).tolist()
+        gyro = np.asarray(gyro, dtype=np.float64).tolist()
+        n = len(acc)
+        mag = [None] * n if mag is None else np.asarray(mag, dtype=np.float64).tolist()
+        dts = np.broadcast_to(np.asarray(dt, dtype=np.float64), (n,)).tolist()
+        out = np.empty((n, 4))
+        update = self.update
+        for i in range(n):
+            update(acc[i], gyro[i], mag[i], dts[i])
+            out[i] = (self.q0, self.q1, self.q2, self.q3)
+        return out
+
+    def _normalise(self, q0, q1, q2, q3) :
+        norm = sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        self.q0 = q0 / norm
+        self.q1 = q1 / norm
+        self.q2 = q2 / norm
+        self.q3 = q3 / norm
+
+
+class Madgwick(QuaternionFilter):
+    # gradient descent filter, S. Madgwick 2010. beta = gyro error gain.
+
+    def __init__(self, beta=0.1) :
+        QuaternionFilter.__init__(self)
+        self.beta = beta
+
+    def _updateIMU(self, gx, gy, gz, ax, ay, az, dt) :
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+
+        # rate of change of quaternion from gyroscope
+        qDot1 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qDot2 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qDot3 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qDot4 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if norm > 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+
+            _2q0 = 2.0 * q0
+            _2q1 = 2.0 * q1
+            _2q2 = 2.0 * q2
+            _2q3 = 2.0 * q3
+            _4q0 = 4.0 * q0
+            _4q1 = 4.0 * q1
+            _4q2 = 4.0 * q2
+            _8q1 = 8.0 * q1
+            _8q2 = 8.0 * q2
+            q0q0 = q0 * q0
+            q1q1 = q1 * q1
+            q2q2 = q2 * q2
+            q3q3 = q3 * q3
+
+            # gradient descent corrective step
+            s0 = _4q0 * q2q2 + _2q2 * ax + _4q0 * q1q1 - _2q1 * ay
+            s1 = (_4q1 * q3q3 - _2q3 * ax + 4.0 * q0q0 * q1 - _2q0 * ay - _4q1
+                  + _8q1 * q1q1 + _8q1 * q2q2 + _4q1 * az)
+            s2 = (4.0 * q0q0 * q2 + _2q0 * ax + _4q2 * q3q3 - _2q3 * ay - _4q2
+                  + _8q2 * q1q1 + _8q2 * q2q2 + _4q2 * az)
+            s3 = 4.0 * q1q1 * q3 - _2q1 * ax + 4.0 * q2q2 * q3 - _2q2 * ay
+            norm = sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm > 0.0:
+                beta = self.beta / norm
+                qDot1 -= beta * s0
+                qDot2 -= beta * s1
+                qDot3 -= beta * s2
+                qDot4 -= beta * s3
+
+        self._normalise(q0 + qDot1 * dt, q1 + qDot2 * dt,
+                        q2 + qDot3 * dt, q3 + qDot4 * dt)
+
+    def _updateMARG(self, gx, gy, gz, ax, ay, az, mx, my, mz, dt) :
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+
+        qDot1 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qDot2 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qDot3 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qDot4 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if norm > 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+            norm = sqrt(mx * mx + my * my + mz * mz)
+            mx /= norm
+            my /= norm
+            mz /= norm
+
+            _2q0mx = 2.0 * q0 * mx
+            _2q0my = 2.0 * q0 * my
+            _2q0mz = 2.0 * q0 * mz
+            _2q1mx = 2.0 * q1 * mx
+            _2q0 = 2.0 * q0
+            _2q1 = 2.0 * q1
+            _2q2 = 2.0 * q2
+            _2q3 = 2.0 * q3
+            _2q0q2 = 2.0 * q0 * q2
+            _2q2q3 = 2.0 * q2 * q3
+            q0q0 = q0 * q0
+            q0q1 = q0 * q1
+            q0q2 = q0 * q2
+            q0q3 = q0 * q3
+            q1q1 = q1 * q1
+            q1q2 = q1 * q2
+            q1q3 = q1 * q3
+            q2q2 = q2 * q2
+            q2q3 = q2 * q3
+            q3q3 = q3 * q3
+
+            # reference direction of the earth's magnetic field
+            hx = (mx * q0q0 - _2q0my * q3 + _2q0mz * q2 + mx * q1q1 + _2q1 * my * q2
+                  + _2q1 * mz * q3 - mx * q2q2 - mx * q3q3)
+            hy = (_2q0mx * q3 + my * q0q0 - _2q0mz * q1 + _2q1mx * q2 - my * q1q1
+                  + my * q2q2 + _2q2 * mz * q3 - my * q3q3)
+            _2bx = sqrt(hx * hx + hy * hy)
+            _2bz = (-_2q0mx * q2 + _2q0my * q1 + mz * q0q0 + _2q1mx * q3 - mz * q1q1
+                    + _2q2 * my * q3 - mz * q2q2 + mz * q3q3)
+            _4bx = 2.0 * _2bx
+            _4bz = 2.0 * _2bz
+
+            # objective function terms shared by the gradient
+            fax = 2.0 * q1q3 - _2q0q2 - ax
+            fay = 2.0 * q0q1 + _2q2q3 - ay
+            faz = 1.0 - 2.0 * q1q1 - 2.0 * q2q2 - az
+            fmx = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx
+            fmy = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my
+            fmz = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz
+
+            s0 = (-_2q2 * fax + _2q1 * fay - _2bz * q2 * fmx
+                  + (-_2bx * q3 + _2bz * q1) * fmy + _2bx * q2 * fmz)
+            s1 = (_2q3 * fax + _2q0 * fay - 4.0 * q1 * faz + _2bz * q3 * fmx
+                  + (_2bx * q2 + _2bz * q0) * fmy + (_2bx * q3 - _4bz * q1) * fmz)
+            s2 = (-_2q0 * fax + _2q3 * fay - 4.0 * q2 * faz
+                  + (-_4bx * q2 - _2bz * q0) * fmx + (_2bx * q1 + _2bz * q3) * fmy
+                  + (_2bx * q0 - _4bz * q2) * fmz)
+            s3 = (_2q1 * fax + _2q2 * fay + (-_4bx * q3 + _2bz * q1) * fmx
+                  + (-_2bx * q0 + _2bz * q2) * fmy + _2bx * q1 * fmz)
+            norm = sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm > 0.0:
+                beta = self.beta / norm
+                qDot1 -= beta * s0
+                qDot2 -= beta * s1
+                qDot3 -= beta * s2
+                qDot4 -= beta * s3
+
+        self._normalise(q0 + qDot1 * dt, q1 + qDot2 * dt,
+                        q2 + qDot3 * dt, q3 + qDot4 * dt)
+
+
+class Mahony(QuaternionFilter):
+    # explicit complementary filter, R. Mahony 2008.
+    # kp = proportional gain, ki = integral gain (gyro bias), 0 disables it
+
+    def __init__(self, kp=1.0, ki=0.0) :
+        QuaternionFilter.__init__(self)
+        self.kp = kp
+        self.ki = ki
+
+    def reset(self) :
+        QuaternionFilter.reset(self)
+        self.ix = 0.0
+        self.iy = 0.0
+        self.iz = 0.0
+
+    def _updateIMU(self, gx, gy, gz, ax, ay, az, dt) :
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if norm > 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+
+            # estimated direction of gravity
+            halfvx = q1 * q3 - q0 * q2
+            halfvy = q0 * q1 + q2 * q3
+            halfvz = q0 * q0 - 0.5 + q3 * q3
+
+            # error is the cross product of measured and estimated gravity
+            halfex = ay * halfvz - az * halfvy
+            halfey = az * halfvx - ax * halfvz
+            halfez = ax * halfvy - ay * halfvx
+            gx, gy, gz = self._feedback(gx, gy, gz, halfex, halfey, halfez, dt)
+
+        self._integrate(q0, q1, q2, q3, gx, gy, gz, dt)
+
+    def _updateMARG(self, gx, gy, gz, ax, ay, az, mx, my, mz, dt) :
+        q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if norm > 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+            norm = sqrt(mx * mx + my * my + mz * mz)
+            mx /= norm
+            my /= norm
+            mz /= norm
+
+            q0q0 = q0 * q0
+            q0q1 = q0 * q1
+            q0q2 = q0 * q2
+            q0q3 = q0 * q3
+            q1q1 = q1 * q1
+            q1q2 = q1 * q2
+            q1q3 = q1 * q3
+            q2q2 = q2 * q2
+            q2q3 = q2 * q3
+            q3q3 = q3 * q3
+
+            # reference direction of the earth's magnetic field
+            hx = 2.0 * (mx * (0.5 - q2q2 - q3q3) + my * (q1q2 - q0q3) + mz * (q1q3 + q0q2))
+            hy = 2.0 * (mx * (q1q2 + q0q3) + my * (0.5 - q1q1 - q3q3) + mz * (q2q3 - q0q1))
+            bx = sqrt(hx * hx + hy * hy)
+            bz = 2.0 * (mx * (q1q3 - q0q2) + my * (q2q3 + q0q1) + mz * (0.5 - q1q1 - q2q2))
+
+            # estimated direction of gravity and magnetic field
+            halfvx = q1q3 - q0q2
+            halfvy = q0q1 + q2q3
+            halfvz = q0q0 - 0.5 + q3q3
+            halfwx = bx * (0.5 - q2q2 - q3q3) + bz * (q1q3 - q0q2)
+            halfwy = bx * (q1q2 - q0q3) + bz * (q0q1 + q2q3)
+            halfwz = bx * (q0q2 + q1q3) + bz * (0.5 - q1q1 - q2q2)
+
+            halfex = (ay * halfvz - az * halfvy) + (my * halfwz - mz * halfwy)
+            halfey = (az * halfvx - ax * halfvz) + (mz * halfwx - mx * halfwz)
+            halfez = (ax * halfvy - ay * halfvx) + (mx * halfwy - my * halfwx)
+            gx, gy, gz = self._feedback(gx, gy, gz, halfex, halfey, halfez, dt)
+
+        self._integrate(q0, q1, q2, q3, gx, gy, gz, dt)
+
+    def _feedback(self, gx, gy, gz, halfex, halfey, halfez, dt) :
+        if self.ki > 0.0:
+            k = 2.0 * self.ki * dt
+            self.ix += k * halfex
+            self.iy += k * halfey
+            self.iz += k * halfez
+            gx += self.ix
+            gy += self.iy
+            gz += self.iz
+        k = 2.0 * self.kp
+        return gx + k * halfex, gy + k * halfey, gz + k * halfez
+
+    def _integrate(self, q0, q1, q2, q3, gx, gy, gz, dt) :
+        gx *= 0.5 * dt
+        gy *= 0.5 * dt
+        gz *= 0.5 * dt
+        self._normalise(q0 + (-q1 * gx - q2 * gy - q3 * gz),
+                        q1 + (q0 * gx + q2 * gz - q3 * gy),
+                        q2 + (q0 * gy - q1 * gz + q3 * gx),
+                        q3 + (q0 * gz + q1 * gy - q2 * gx))
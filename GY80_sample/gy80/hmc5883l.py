@@ -0,0 +1,216 @@
+import time
+from math import atan2, cos, degrees, pi, radians, sin
+
+from .imu import IMU
+from . import magcal
+
+# HMC5883L
+# the following address is defined by datasheet
+#HMC5883L (Magnetometer) constants
+HMC5883L_ADDRESS        =    0x1E  # I2C address
+
+HMC5883L_CRA            =    0x00  # write CRA(00), Configuration Register A
+HMC5883L_CRB            =    0x01  # write CRB(01), Configuration Register B
+HMC5883L_MR             =    0x02  # write Mode(02)
+HMC5883L_DO_X_H         =    0x03  # Data Output
+HMC5883L_DO_X_L         =    0x04
+HMC5883L_DO_Z_H         =    0x05
+HMC5883L_DO_Z_L         =    0x06
+HMC5883L_DO_Y_H         =    0x07
+HMC5883L_DO_Y_L         =    0x08
+HMC5883L_SR             =    0x09  # Status Register
+HMC5883L_SR_RDY         =    0x01  # new data in all six output registers
+HMC5883L_SR_LOCK        =    0x02  # output registers locked until all six are read
+HMC5883L_MODE_CONTINUOUS=    0b00000000
+HMC5883L_MODE_SINGLE    =    0b00000001
+HMC5883L_MODE_IDLE      =    0b00000011
+HMC5883L_SINGLE_WAIT    =    0.006 # s, one single measurement
+
+# output data rate (Hz, continuous mode) -> CRA DO2-DO0
+HMC5883L_RATES = {0.75: 0, 1.5: 1, 3: 2, 7.5: 3, 15: 4, 30: 5, 75: 6}
+
+# samples averaged per measurement -> CRA MA1-MA0
+HMC5883L_AVERAGING = {1: 0, 2: 1, 4: 2, 8: 3}
+
+
+def tilt_compensate(mx, my, mz, sin_r, cos_r, sin_p, cos_p):
+    # magnetometer vector rotated back to the horizontal plane. Plain
+    # arithmetic, so it works on floats as well as on numpy arrays
+    # (gy80.batch.heading).
+    compx = mx * cos_p + mz * sin_p
+    compy = mx * sin_r * sin_p + my * cos_r - mz * sin_r * cos_p
+    return compx, compy
+
+
+def tilt_heading(mag, roll, pitch, declination=0.0):
+    # tilt compensated heading in [0, 360) degrees. roll and pitch in
+    # degrees (e.g. QuaternionFilter.euler()), declination in degrees
+    # (degrees(compass.angle_offset)).
+    r = radians(roll)
+    p = radians(pitch)
+    compx, compy = tilt_compensate(mag[0], mag[1], mag[2], sin(r), cos(r), sin(p), cos(p))
+    return (degrees(atan2(compy, compx)) + declination) % 360.0
+
+
+class HMC5883L(IMU):
+
+    ADDRESS = HMC5883L_ADDRESS
+    XYZ_REG = HMC5883L_DO_X_H
+    XYZ_RF = 0
+    XYZ_ORDER = (0, 2, 1)
+
+    def __init__(self, bus=None, rate=15, samples=8, single=False) :
+        IMU.__init__(self, bus)
+        #Class Properties
+        self.X = None
+        self.Y = None
+        self.Z = None
+        self.angle = None
+        self.Xoffset = 31
+        self.Yoffset = -97
+        self.Zoffset = -326
+
+        # Declination Angle
+        self.angle_offset = ( -1 * (4 + (32/60))) / (180 / pi)
+        # Formula: (deg + (min / 60.0)) / (180 / M_PI);
+        # ex: Hsinchu = Magnetic Declination: -4 deg, 32 min
+        # declinationAngle = ( -1 * (4 + (32/60))) / (180 / pi)
+        # http://www.magnetic-declination.com/
+
+        self.scale = 0.92 # convert bit value(LSB) to gauss. DigitalResolution
+
+        # hard / soft iron calibration saved by 3calibrate-hmc5883l.py;
+        # without one only the offsets above are applied
+        self.calibrated = False
+        self.setCalibration(magcal.load(self.ADDRESS, self.bus))
+
+        # Configuration Register A, 8 samples @ 15Hz by default
+        self.setDataRate(rate, samples)
+
+        # Configuration Register B
+        self.write_byte(HMC5883L_CRB, 0b00100000)
+
+        # Mode Register
+        self.setMode(single)
+
+    def setCalibration(self, calibration) :
+        # calibration: (offset, 3x3 soft iron matrix) in raw counts, or None.
+        # The scale is folded into the matrix so getXYZ does one
+        # matrix-vector product per sample.
+        if calibration is None:
+            matrix = ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+            self.calibrated = False
+        else:
+            offset, matrix = calibration
+            self.Xoffset, self.Yoffset, self.Zoffset = offset
+            self.calibrated = True
+        self.matrix = tuple(tuple(e * self.scale for e in row) for row in matrix)
+
+    def reinit(self) :
+        self.setDataRate(self.rate, self.samples)
+        self.write_byte(HMC5883L_CRB, 0b00100000)
+        self.setMode(self.single)
+
+    def powerDown(self) :
+        self.write_byte(HMC5883L_MR, HMC5883L_MODE_IDLE)
+
+    def setDataRate(self, rate, samples=8) :
+        if rate not in HMC5883L_RATES:
+            raise ValueError("unsupported HMC5883L rate %r Hz, use one of %s"
+                             % (rate, sorted(HMC5883L_RATES)))
+        if samples not in HMC5883L_AVERAGING:
+            raise ValueError("unsupported HMC5883L averaging %r, use one of %s"
+                             % (samples, sorted(HMC5883L_AVERAGING)))
+        self.write_byte(HMC5883L_CRA, (HMC5883L_AVERAGING[samples] << 5) | (HMC5883L_RATES[rate] << 2))
+        self.rate = rate
+        self.samples = samples
+        self._due = 0.0
+
+    # Data ready aware reading.
+    # Continuous mode: a new sample every 1/rate s. Single mode: trigger()
+    # starts one measurement (~6 ms), after which the chip goes idle.
+    # poll() only touches the bus once a new sample can be expected, then
+    # checks RDY and reads all six output registers in one block (reading
+    # them all also releases LOCK), so it never returns a repeated or torn
+    # sample.
+    def setMode(self, single=False) :
+        self.single = single
+        self.triggered = False
+        if single:
+            self.write_byte(HMC5883L_MR, HMC5883L_MODE_IDLE)
+        else:
+            self.write_byte(HMC5883L_MR, HMC5883L_MODE_CONTINUOUS)
+            self._due = time.monotonic()
+
+    def trigger(self) :
+        self.write_byte(HMC5883L_MR, HMC5883L_MODE_SINGLE)
+        self.triggered = True
+        self._due = time.monotonic() + HMC5883L_SINGLE_WAIT
+
+    def status(self) :
+        return self.read_byte(HMC5883L_SR)
+
+    def ready(self) :
+        return bool(self.status() & HMC5883L_SR_RDY)
+
+    def poll(self) :
+        # (X, Y, Z) if a new sample was read, otherwise None. In single
+        # mode a measurement is triggered when none is pending.
+        if self.single and not self.triggered:
+            self.trigger()
+            return None
+        now = time.monotonic()
+        if now < self._due or not self.ready():
+            return None
+        xyz = self._convert(*self.read_xyz())
+        if self.single:
+            self.triggered = False
+        else:
+            # the next sample is one period after the previous due time (the
+            # chip's cadence), not after this read; resynchronise only when
+            # a whole period behind
+            period = 1.0 / self.rate
+            self._due += period
+            if self._due + period <= now:
+                self._due = now
+        return xyz
+
+    def getX(self):
+        self.X = (self.read_word_2c(HMC5883L_DO_X_H, rf=0) - self.Xoffset) * self.scale
+        return self.X
+
+    def getY(self):
+        self.Y = (self.read_word_2c(HMC5883L_DO_Y_H, rf=0) - self.Yoffset) * self.scale
+        return self.Y
+
+    def getZ(self):
+        self.Z = (self.read_word_2c(HMC5883L_DO_Z_H, rf=0) - self.Zoffset) * self.scale
+        return self.Z
+
+    # getX/getY/getZ only remove the offset; the soft iron matrix mixes
+    # the axes and needs all three, use getXYZ for calibrated readings
+
+    def getXYZ(self):
+        return self._convert(*self.read_xyz())
+
+    def _convert(self, xraw, yraw, zraw):
+        x = xraw - self.Xoffset
+        y = yraw - self.Yoffset
+        z = zraw - self.Zoffset
+        (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = self.matrix
+        self.X = m00 * x + m01 * y + m02 * z
+        self.Y = m10 * x + m11 * y + m12 * z
+        self.Z = m20 * x + m21 * y + m22 * z
+        return self.X, self.Y, self.Z
+
+    def getHeading(self):
+        magx, magy, magz = self.getXYZ()
+        # angle_offset is in radians
+        bearing  = degrees(atan2(magy, magx) + self.angle_offset)
+
+        if (bearing < 0):
+            bearing += 360
+        if (bearing >= 360):
+            bearing -= 360
+        self.angle = bearing
+        return self.angle
@@ -0,0 +1,180 @@
+# Multi-threaded sensor hub: every chip at its own rate.
+#
+# Reading the four chips in series makes the slowest one (the BMP180)
+# set the rate for all of them. SensorHub runs one acquisition thread per
+# chip, each on its own PeriodicScheduler, and arbitrates the single I2C
+# bus with one lock held only for the duration of a transaction.
+#
+# Each thread publishes its newest sample into a LatestSlot. Publishing is
+# a single reference assignment of an immutable Sample tuple, so readers
+# never take a lock and never block on a slow sensor; they just get the
+# newest complete sample (and can tell from seq whether it is new).
+#
+#     with SensorHub(rates={'gyro': 400, 'accel': 400}) as hub:
+#         for tick in PeriodicScheduler(rate=200):
+#             acc = hub.latest('accel')     # Sample(seq, t_ns, value) or None
+#             gyro = hub.latest('gyro')
+
+import collections
+import threading
+import time
+
+from .bus import get_bus
+from .scheduler import PeriodicScheduler
+
+Sample = collections.namedtuple('Sample', 'seq t_ns value')
+
+DEFAULT_RATES = {
+    'accel': 400,       # Hz
+    'gyro': 400,
+    'compass': 75,      # polled; only fresh samples are published
+    'baro': 50,         # update() ticks, one conversion each; every eleventh is a
+                        # temperature, so ~45 altitudes/s at 50 Hz
+}
+
+
+def output_rate(rate, rates) :
+    # slowest output data rate of the chip (a key of rates) that is at
+    # least the polling rate, so every poll sees a new conversion;
+    # the fastest one if the chip cannot keep up
+    faster = [r for r in rates if r >= rate]
+    return min(faster) if faster else max(rates)
+
+
+class LatestSlot(object):
+    # Single-writer, many-reader slot holding the newest Sample.
+
+    def __init__(self) :
+        self.sample = None
+        self._seq = 0
+
+    def publish(self, value, t_ns=None) :
+        self._seq += 1
+        self.sample = Sample(self._seq, t_ns if t_ns is not None else time.monotonic_ns(), value)
+
+    def get(self) :
+        return self.sample
+
+
+class LockedBus(object):
+    # Wraps a bus so that every transaction holds one shared lock.
+
+    def __init__(self, bus, lock=None) :
+        self.bus = bus
+        self.lock = lock if lock is not None else threading.Lock()
+
+    def read_byte_data(self, address, register) :
+        with self.lock:
+            return self.bus.read_byte_data(address, register)
+
+    def write_byte_data(self, address, register, value) :
+        with self.lock:
+            self.bus.write_byte_data(address, register, value)
+
+    def read_i2c_block_data(self, address, register, length=32) :
+        with self.lock:
+            return self.bus.read_i2c_block_data(address, register, length)
+
+    def write_i2c_block_data(self, address, register, data) :
+        with self.lock:
+            self.bus.write_i2c_block_data(address, register, data)
+
+
+class SensorHub(object):
+
+    def __init__(self, bus=None, rates=None) :
+        self.rates = dict(DEFAULT_RATES)
+        if rates:
+            self.rates.update(rates)
+        self.bus = LockedBus(bus if bus is not None else get_bus())
+        self.slots = dict((name, LatestSlot()) for name in self.rates)
+        self.schedulers = {}
+        self.errors = collections.Counter()
+        self.last_error = {}
+        self.sensors = {}
+        self._threads = []
+        self._stop = threading.Event()
+
+    def _reader(self, name) :
+        # function doing one acquisition of `name`, returns the value to
+        # publish or None when there is nothing new
+        sensor = self.sensors[name]
+        if name == 'accel':
+            return sensor.getXYZg
+        if name == 'gyro':
+            return sensor.getXYZ
+        if name == 'compass':
+            return sensor.poll
+        if name == 'baro':
+            def baro():
+                if sensor.update():
+                    return sensor.press, sensor.altitude
+                return None
+            return baro
+        raise ValueError("unknown sensor %r" % (name,))
+
+    def _open(self, name) :
+        # the chips convert at least as fast as they are polled
+        rate = self.rates[name]
+        if name == 'accel':
+            from .adxl345 import ADXL345, ADXL345_RATES
+            return ADXL345(self.bus, rate=output_rate(rate, ADXL345_RATES))
+        if name == 'gyro':
+            from .l3g4200d import L3G4200D, L3G4200D_RATES
+            return L3G4200D(self.bus, rate=output_rate(rate, L3G4200D_RATES))
+        if name == 'compass':
+            from .hmc5883l import HMC5883L, HMC5883L_RATES
+            return HMC5883L(self.bus, rate=output_rate(rate, HMC5883L_RATES))
+        if name == 'baro':
+            from .bmp180 import BMP180
+            return BMP180(self.bus)
+        raise ValueError("unknown sensor %r" % (name,))
+
+    def _run(self, name, read, scheduler, slot) :
+        for tick in scheduler:
+            if self._stop.is_set():
+                break
+            try:
+                value = read()
+            except (IOError, OSError) as e:
+                self.errors[name] += 1
+                self.last_error[name] = e
+                continue
+            if value is not None:
+                slot.publish(value)
+
+    def start(self) :
+        if self._threads:
+            return self
+        self._stop.clear()
+        for name in self.rates:
+            if name not in self.sensors:
+                self.sensors[name] = self._open(name)
+        for name, rate in self.rates.items():
+            scheduler = PeriodicScheduler(rate=rate)
+            self.schedulers[name] = scheduler
+            t = threading.Thread(target=self._run, name='gy80-hub-' + name,
+                                 args=(name, self._reader(name), scheduler, self.slots[name]))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self) :
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def latest(self, name) :
+        return self.slots[name].sample
+
+    def stats(self) :
+        return dict((name, s.stats()) for name, s in self.schedulers.items())
+
+    def __enter__(self) :
+        return self.start()
+
+    def __exit__(self, *exc) :
+        self.stop()
+        return False
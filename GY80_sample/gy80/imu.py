@@ -0,0 +1,53 @@
+from . import decode
+from .bus import get_bus
+
+
+class IMU(object):
+
+    ADDRESS = None
+
+    # data registers for read_xyz(): first register, byte order and the
+    # position of X, Y, Z in the register block
+    XYZ_REG = None
+    XYZ_RF = 1
+    XYZ_ORDER = (0, 1, 2)
+
+    def __init__(self, bus=None):
+        self.bus = bus if bus is not None else get_bus()
+
+    def reinit(self):
+        # write the chip's configuration again (after a brown-out reset
+        # it is back at its power-on defaults); drivers override this
+        pass
+
+    def write_byte(self,adr, value):
+        self.bus.write_byte_data(self.ADDRESS, adr, value)
+
+    def read_byte(self,adr):
+        return self.bus.read_byte_data(self.ADDRESS, adr)
+
+    def read_word(self,adr,rf=1):
+        # rf=1 Little Endian Format, rf=0 Big Endian Format
+        if (rf == 1):
+            # acc, gyro
+            low = self.read_byte(adr)
+            high = self.read_byte(adr+1)
+        else:
+            # compass
+            high = self.read_byte(adr)
+            low = self.read_byte(adr+1)
+        val = (high << 8) + low
+        return val
+
+    def read_word_2c(self,adr,rf=1):
+        # the two registers in address order, decoded like the burst reads
+        return decode.word((self.read_byte(adr), self.read_byte(adr+1)), rf)
+
+    def read_block(self,adr,length):
+        return self.bus.read_i2c_block_data(self.ADDRESS, adr, length)
+
+    def read_xyz(self):
+        # one burst read of the six data registers, so the three axes
+        # always come from the same sample (no torn high/low bytes);
+        # registers are laid out X, Y, Z except on the compass (X, Z, Y)
+        return decode.xyz(self.read_block(self.XYZ_REG, 6), self.XYZ_RF, self.XYZ_ORDER)
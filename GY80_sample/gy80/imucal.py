@@ -0,0 +1,193 @@
+# Gyro bias and accelerometer calibration, kept in a per-device profile.
+#
+# RunningVariance is an exponentially weighted mean / variance per axis.
+# StillnessDetector uses it to decide when the board is at rest, and
+# GyroBiasTracker refines the gyro bias during those still periods, so
+# the bias keeps up with temperature drift instead of being measured once.
+#
+#     gyro = L3G4200D()
+#     gyro.calibrateBias()        # board still for ~2 s at start-up
+#     gyro.trackBias()            # keep refining it in getXYZ()
+#
+# SixPositionCalibration is the guided accelerometer calibration: the
+# board is laid on each of its six faces in turn and the two readings of
+# every axis (+1 g and -1 g) give its scale and offset.
+#
+# Profiles live in the calibration store, one kind per chip
+# ('l3g4200d', 'adxl345'), keyed by bus and address. The drivers load
+# them at start-up.
+
+import time
+
+from . import store
+
+# still when the gyro variance stays below this (dps^2, all axes) ...
+GYRO_STILL_VARIANCE = 0.05
+# ... and no axis reads more than this away from the current bias (dps)
+GYRO_STILL_RATE = 2.0
+# accelerometer variance (g^2) accepted while measuring a position
+ACCEL_STILL_VARIANCE = 0.0004
+
+
+def load(name, address, bus=None):
+    return store.get(name, store.chip_key(name, address, bus))
+
+
+def save(name, address, bus=None, **values):
+    # merge into the chip's profile, other entries are kept
+    key = store.chip_key(name, address, bus)
+    profile = store.get(name, key) or {}
+    profile.update(values)
+    return store.put(name, key, profile)
+
+
+class RunningVariance(object):
+
+    def __init__(self, alpha=0.05) :
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self) :
+        self.count = 0
+        self.mean = [0.0, 0.0, 0.0]
+        self.var = [0.0, 0.0, 0.0]
+
+    def update(self, x, y, z) :
+        if self.count == 0:
+            self.mean = [x, y, z]
+        else:
+            a = self.alpha
+            mean = self.mean
+            var = self.var
+            for i, v in enumerate((x, y, z)):
+                d = v - mean[i]
+                mean[i] += a * d
+                var[i] = (1.0 - a) * (var[i] + a * d * d)
+        self.count += 1
+
+    def total(self) :
+        return self.var[0] + self.var[1] + self.var[2]
+
+
+class StillnessDetector(object):
+    # still once the variance has stayed under threshold for `hold` samples
+
+    def __init__(self, threshold=GYRO_STILL_VARIANCE, alpha=0.05, hold=50) :
+        self.threshold = threshold
+        self.hold = hold
+        self.stats = RunningVariance(alpha)
+        self.quiet = 0
+
+    def update(self, x, y, z) :
+        self.stats.update(x, y, z)
+        if self.stats.count > 1 and self.stats.total() < self.threshold:
+            self.quiet += 1
+        else:
+            self.quiet = 0
+        return self.still()
+
+    def still(self) :
+        return self.quiet >= self.hold
+
+
+class GyroBiasTracker(object):
+    # Fed with the bias free rates (dps) from L3G4200D.getXYZ(); nudges the
+    # driver's bias towards the reading while the board is still.
+
+    def __init__(self, gyro, alpha=0.005, threshold=GYRO_STILL_VARIANCE, rate=GYRO_STILL_RATE, hold=50) :
+        self.gyro = gyro
+        self.alpha = alpha
+        self.rate = rate
+        self.detector = StillnessDetector(threshold, hold=hold)
+        self.updates = 0
+
+    def update(self, x, y, z) :
+        # x, y, z: rates with the current bias already removed
+        if not self.detector.update(x, y, z):
+            return False
+        # a steady turn also has a low variance, only accept small rates
+        if abs(x) > self.rate or abs(y) > self.rate or abs(z) > self.rate:
+            return False
+        a = self.alpha
+        g = self.gyro
+        g.Xbias += a * x
+        g.Ybias += a * y
+        g.Zbias += a * z
+        self.updates += 1
+        return True
+
+
+def measure(read, samples, interval=0.0):
+    # mean and variance of `samples` calls of read() -> (x, y, z)
+    stats = [[0.0, 0.0], [0.0, 0.0], [0.0, 0.0]]
+    for n in range(1, samples + 1):
+        for i, v in enumerate(read()):
+            s = stats[i]
+            d = v - s[0]
+            s[0] += d / n
+            s[1] += d * (v - s[0])
+        if interval:
+            time.sleep(interval)
+    mean = [s[0] for s in stats]
+    var = [s[1] / max(samples - 1, 1) for s in stats]
+    return mean, var
+
+
+class SixPositionCalibration(object):
+    # Guided scale / offset calibration of the ADXL345:
+    #
+    #     cal = SixPositionCalibration(accel)
+    #     for position, hint in cal.POSITIONS:
+    #         input("place the board " + hint)
+    #         cal.measure(position)
+    #     cal.save()
+
+    POSITIONS = (
+        ('+Z', "flat, components up"),
+        ('-Z', "flat, upside down"),
+        ('+X', "on its edge, X arrow up"),
+        ('-X', "on its edge, X arrow down"),
+        ('+Y', "on its edge, Y arrow up"),
+        ('-Y', "on its edge, Y arrow down"),
+    )
+
+    def __init__(self, accel, samples=100) :
+        self.accel = accel
+        self.samples = samples
+        self.readings = {}
+
+    def measure(self, position) :
+        # average raw reading for one position; ValueError if the board moved
+        if position not in dict(self.POSITIONS):
+            raise ValueError("unknown position %r" % (position,))
+        mean, var = measure(self.accel.getRawXYZ, self.samples, 1.0 / self.accel.rate)
+        scale = self.accel.scale
+        if sum(var) * scale * scale > ACCEL_STILL_VARIANCE:
+            raise ValueError("board moved while measuring %s, try again" % position)
+        self.readings[position] = mean
+        return mean
+
+    def missing(self) :
+        return [p for p, hint in self.POSITIONS if p not in self.readings]
+
+    def solve(self) :
+        # per axis gain (relative to the nominal scale) and offset in g
+        if self.missing():
+            raise ValueError("positions not measured: %s" % ", ".join(self.missing()))
+        gain = []
+        offset = []
+        for i, axis in enumerate('XYZ'):
+            up = self.readings['+' + axis][i]
+            down = self.readings['-' + axis][i]
+            if up <= down:
+                raise ValueError("%s axis readings are not +1 g / -1 g" % axis)
+            calibr = 2.0 / (up - down)             # g/LSB
+            gain.append(calibr / self.accel.scale)
+            offset.append(-(up + down) / 2.0 * calibr)
+        return gain, offset
+
+    def save(self) :
+        gain, offset = self.solve()
+        self.accel.setCalibration(gain, offset)
+        save('adxl345', self.accel.ADDRESS, self.accel.bus, gain=gain, offset=offset)
+        return gain, offset
@@ -0,0 +1,233 @@
+import time
+
+from .imu import IMU
+from . import imucal
+from .timing import SampleClock
+
+# L3G4200D
+L3G4200D_ADDRESS        =    0x69
+L3G4200D_CTRL_REG1      =    0x20
+L3G4200D_CTRL_REG4      =    0x23
+L3G4200D_CTRL_REG5      =    0x24
+L3G4200D_OUT_X_L        =    0x28
+L3G4200D_OUT_X_H        =    0x29
+L3G4200D_OUT_Y_L        =    0x2A
+L3G4200D_OUT_Y_H        =    0x2B
+L3G4200D_OUT_Z_L        =    0x2C
+L3G4200D_OUT_Z_H        =    0x2D
+L3G4200D_FIFO_CTRL_REG  =    0x2E
+L3G4200D_FIFO_SRC_REG   =    0x2F
+L3G4200D_POWER_DOWN     =    0x00  # CTRL_REG1 PD bit cleared
+L3G4200D_AUTO_INCREMENT =    0x80  # MSB of sub-address: auto-increment for multi-byte reads
+
+L3G4200D_FIFO_EN        =    0x40  # CTRL_REG5 D6
+L3G4200D_FIFO_BYPASS    =    0x00  # FIFO_CTRL_REG FM2-FM0 = 000
+L3G4200D_FIFO_STREAM    =    0x40  # FM2-FM0 = 010, WTM4-WTM0 = watermark
+L3G4200D_FIFO_OVRN      =    0x40  # FIFO_SRC_REG overrun flag
+L3G4200D_FIFO_SIZE      =    32
+L3G4200D_FIFO_BURST     =    5     # samples per 32 byte block read
+
+L3G4200D_BDU            =    0x80  # CTRL_REG4 D7, block data update
+
+# output data rate (Hz) -> CTRL_REG1 DR1-DR0
+L3G4200D_RATES = {100: 0b00, 200: 0b01, 400: 0b10, 800: 0b11}
+
+# full scale (dps) -> CTRL_REG4 FS1-FS0
+L3G4200D_RANGES = {250: 0b00, 500: 0b01, 2000: 0b10}
+
+# sensitivity (dps/digit) by FS1-FS0, datasheet table 4 (11 is 2000 dps too)
+L3G4200D_SENSITIVITY = (0.00875, 0.0175, 0.070, 0.070)
+
+
+class L3G4200D(IMU):
+
+    ADDRESS = L3G4200D_ADDRESS
+    XYZ_REG = L3G4200D_OUT_X_L | L3G4200D_AUTO_INCREMENT
+    XYZ_RF = 1
+    XYZ_ORDER = (0, 1, 2)
+
+    def __init__(self, bus=None, rate=100, full_scale=250) :
+        IMU.__init__(self, bus)
+        #Class Properties
+        self.Xraw = 0.0
+        self.Yraw = 0.0
+        self.Zraw = 0.0
+        self.X = 0.0
+        self.Y = 0.0
+        self.Z = 0.0
+        self.Xangle = 0.0
+        self.Yangle = 0.0
+        self.Zangle = 0.0
+        self.t0x = None
+        self.t0y = None
+        self.t0z = None
+        self.clock = SampleClock()
+
+        # set value
+        self.gain_std = L3G4200D_SENSITIVITY[0]    # dps/digit at 250 dps
+        self.rate = 100
+        self.full_scale = 250
+        self.fifo_overruns = 0
+
+        # zero-rate level in dps, from the profile or calibrateBias()
+        self.Xbias = 0.0
+        self.Ybias = 0.0
+        self.Zbias = 0.0
+        self.bias_tracker = None
+        profile = imucal.load('l3g4200d', self.ADDRESS, self.bus)
+        if profile and 'bias' in profile:
+            self.Xbias, self.Ybias, self.Zbias = profile['bias']
+
+        self.setDataRate(rate)
+        self.setRange(full_scale)
+
+    def setCalibration(self) :
+        # gain from the full scale bits the chip actually has
+        gyr_r = self.read_byte(L3G4200D_CTRL_REG4)
+
+        self.gain = L3G4200D_SENSITIVITY[(gyr_r >> 4) & 0x03]
+
+    def setRange(self, full_scale) :
+        if full_scale not in L3G4200D_RANGES:
+            raise ValueError("unsupported L3G4200D range %r dps, use one of %s"
+                             % (full_scale, sorted(L3G4200D_RANGES)))
+        self.write_byte(L3G4200D_CTRL_REG4, L3G4200D_BDU | (L3G4200D_RANGES[full_scale] << 4))
+        self.full_scale = full_scale
+        self.setCalibration()
+
+    # With the bias removed the integrated angles no longer drift, so there
+    # is no need to smooth the rates with a small plf (and its lag).
+    def calibrateBias(self, samples=200, save=True) :
+        # average `samples` readings at the data rate; the board must be still
+        self.Xbias = self.Ybias = self.Zbias = 0.0
+        bias, var = imucal.measure(self.getXYZ, samples, 1.0 / self.rate)
+        if sum(var) > imucal.GYRO_STILL_VARIANCE * 4:
+            raise ValueError("gyro moved during bias calibration, keep the board still")
+        self.Xbias, self.Ybias, self.Zbias = bias
+        if save:
+            imucal.save('l3g4200d', self.ADDRESS, self.bus, bias=bias)
+        return bias
+
+    def trackBias(self, enable=True, **kwargs) :
+        # refine the bias in getXYZ() whenever the board is still
+        self.bias_tracker = imucal.GyroBiasTracker(self, **kwargs) if enable else None
+
+    def reinit(self) :
+        self.setDataRate(self.rate)
+        self.setRange(self.full_scale)
+
+    def powerDown(self) :
+        self.write_byte(L3G4200D_CTRL_REG1, L3G4200D_POWER_DOWN)
+
+    def setDataRate(self, rate) :
+        if rate not in L3G4200D_RATES:
+            raise ValueError("unsupported L3G4200D rate %r Hz, use one of %s"
+                             % (rate, sorted(L3G4200D_RATES)))
+        # DR bits, bandwidth 00, power on, X/Y/Z enabled
+        self.write_byte(L3G4200D_CTRL_REG1, (L3G4200D_RATES[rate] << 6) | 0x0F)
+        self.rate = rate
+
+    # FIFO, stream mode: the chip keeps the newest 32 samples.
+    # With the FIFO enabled the read pointer wraps from OUT_Z_H back to
+    # OUT_X_L, so one auto-increment block read returns several samples.
+    def startFifo(self, watermark=16) :
+        reg5 = self.read_byte(L3G4200D_CTRL_REG5)
+        self.write_byte(L3G4200D_CTRL_REG5, reg5 | L3G4200D_FIFO_EN)
+        self.write_byte(L3G4200D_FIFO_CTRL_REG, L3G4200D_FIFO_STREAM | (watermark & 0x1F))
+
+    def stopFifo(self) :
+        self.write_byte(L3G4200D_FIFO_CTRL_REG, L3G4200D_FIFO_BYPASS)
+        reg5 = self.read_byte(L3G4200D_CTRL_REG5)
+        self.write_byte(L3G4200D_CTRL_REG5, reg5 & ~L3G4200D_FIFO_EN & 0xFF)
+
+    def fifoCount(self) :
+        src = self.read_byte(L3G4200D_FIFO_SRC_REG)
+        if src & L3G4200D_FIFO_OVRN:
+            # full and the oldest samples were overwritten
+            self.fifo_overruns += 1
+            return L3G4200D_FIFO_SIZE
+        return src & 0x1F
+
+    def readFifo(self, count) :
+        data = bytearray()
+        while count > 0:
+            n = min(count, L3G4200D_FIFO_BURST)
+            data.extend(self.read_block(self.XYZ_REG, 6 * n))
+            count -= n
+        return data
+
+    def getRawX(self):
+        self.Xraw = self.read_word_2c(L3G4200D_OUT_X_L)
+        return self.Xraw
+
+    def getRawY(self):
+        self.Yraw = self.read_word_2c(L3G4200D_OUT_Y_L)
+        return self.Yraw
+
+    def getRawZ(self):
+        self.Zraw = self.read_word_2c(L3G4200D_OUT_Z_L)
+        return self.Zraw
+
+    def getRawXYZ(self):
+        self.Xraw, self.Yraw, self.Zraw = self.read_xyz()
+        return self.Xraw, self.Yraw, self.Zraw
+
+    def getX(self,plf = 1.0):
+        self.X = ( self.getRawX() * self.gain - self.Xbias ) * plf + (1.0 - plf) * self.X
+        return self.X
+
+    def getY(self,plf = 1.0):
+        self.Y = ( self.getRawY() * self.gain - self.Ybias ) * plf + (1.0 - plf) * self.Y
+        return self.Y
+
+    def getZ(self,plf = 1.0):
+        self.Z = ( self.getRawZ() * self.gain - self.Zbias ) * plf + (1.0 - plf) * self.Z
+        return self.Z
+
+    def getXYZ(self,plf = 1.0):
+        xraw, yraw, zraw = self.getRawXYZ()
+        x = xraw * self.gain - self.Xbias
+        y = yraw * self.gain - self.Ybias
+        z = zraw * self.gain - self.Zbias
+        if self.bias_tracker is not None:
+            self.bias_tracker.update(x, y, z)
+        self.X = x * plf + (1.0 - plf) * self.X
+        self.Y = y * plf + (1.0 - plf) * self.Y
+        self.Z = z * plf + (1.0 - plf) * self.Z
+        return self.X, self.Y, self.Z
+
+    # angle change since the previous call, in deg.
+    # getXYZangle() reads the three axes together and integrates them over
+    # one shared dt (self.clock also keeps the jitter statistics); the
+    # single axis versions below each keep their own time base.
+    def getXYZangle(self,plf = 1.0) :
+        x, y, z = self.getXYZ(plf)
+        dt = self.clock.tick()
+        self.Xangle = x * dt
+        self.Yangle = y * dt
+        self.Zangle = z * dt
+        return self.Xangle, self.Yangle, self.Zangle
+
+    def getXangle(self,plf = 1.0) :
+        if self.t0x is None : self.t0x = time.monotonic()
+        t1x = time.monotonic()
+        LP = t1x - self.t0x
+        self.t0x = t1x
+        self.Xangle = self.getX(plf) * LP
+        return self.Xangle
+
+    def getYangle(self,plf = 1.0) :
+        if self.t0y is None : self.t0y = time.monotonic()
+        t1y = time.monotonic()
+        LP = t1y - self.t0y
+        self.t0y = t1y
+        self.Yangle = self.getY(plf) * LP
+        return self.Yangle
+
+    def getZangle(self,plf = 1.0) :
+        if self.t0z is None : self.t0z = time.monotonic()
+        t1z = time.monotonic()
+        LP = t1z - self.t0z
+        self.t0z = t1z
+        self.Zangle = self.getZ(plf) * LP
+        return self.Zangle
@@ -0,0 +1,102 @@
+# Hard / soft iron calibration of the HMC5883L by ellipsoid fitting.
+#
+# Away from local disturbances the raw magnetometer readings of a board
+# turned through all orientations lie on an ellipsoid: shifted by the hard
+# iron offset and stretched / rotated by soft iron. EllipsoidCalibrator
+# fits the general quadric
+#
+#     a x^2 + b y^2 + c z^2 + 2f yz + 2g xz + 2h xy + 2p x + 2q y + 2r z = 1
+#
+# by least squares. It only keeps the 9x9 normal equations, so every
+# sample costs O(1) time and memory however long the calibration runs.
+# solve() turns the quadric into an offset and a symmetric 3x3 matrix W so
+# that W (raw - offset) lies on a sphere (radius kept close to the mean
+# raw field), and save() stores both in the calibration store where
+# HMC5883L picks them up at start-up.
+
+from . import store
+
+# raw counts are scaled down before accumulating to keep the normal
+# equations well conditioned
+_SCALE = 1.0 / 1024
+
+
+class EllipsoidCalibrator(object):
+
+    def __init__(self) :
+        self.reset()
+
+    def reset(self) :
+        self.count = 0
+        self._ata = [[0.0] * 9 for i in range(9)]
+        self._atb = [0.0] * 9
+        self.min = [None] * 3
+        self.max = [None] * 3
+
+    def add(self, x, y, z) :
+        # one raw sample (counts)
+        for i, v in enumerate((x, y, z)):
+            if self.min[i] is None or v < self.min[i]:
+                self.min[i] = v
+            if self.max[i] is None or v > self.max[i]:
+                self.max[i] = v
+        x *= _SCALE
+        y *= _SCALE
+        z *= _SCALE
+        row = (x * x, y * y, z * z, 2 * y * z, 2 * x * z, 2 * x * y, 2 * x, 2 * y, 2 * z)
+        ata = self._ata
+        atb = self._atb
+        for i in range(9):
+            ri = row[i]
+            atb[i] += ri
+            ata_i = ata[i]
+            for j in range(i, 9):
+                ata_i[j] += ri * row[j]
+        self.count += 1
+
+    def solve(self) :
+        # (offset, matrix) in raw counts; needs samples from many
+        # orientations, raises ValueError when the fit is degenerate
+        import numpy as np
+        if self.count < 9:
+            raise ValueError("need at least 9 samples, got %d" % self.count)
+        ata = np.array(self._ata)
+        ata = np.triu(ata) + np.triu(ata, 1).T
+        try:
+            a, b, c, f, g, h, p, q, r = np.linalg.solve(ata, np.array(self._atb))
+        except np.linalg.LinAlgError:
+            raise ValueError("degenerate fit, rotate the board through more orientations")
+
+        m = np.array([[a, h, g], [h, b, f], [g, f, c]])
+        v = np.array([p, q, r])
+        center = -np.linalg.solve(m, v)
+        k = 1.0 + center.dot(m).dot(center)
+        shape = m / k
+        w, vecs = np.linalg.eigh(shape)
+        if k <= 0 or (w <= 0).any():
+            raise ValueError("fit is not an ellipsoid, rotate the board through more orientations")
+        # W = shape^(1/2), scaled so that the sphere radius is the
+        # geometric mean of the ellipsoid semi-axes (scale invariant)
+        root = vecs.dot(np.diag(np.sqrt(w))).dot(vecs.T)
+        radius = np.prod(w) ** (-1.0 / 6)
+        matrix = root * radius
+        offset = center / _SCALE
+        return [float(o) for o in offset], [[float(e) for e in row] for row in matrix]
+
+    def min_max_offset(self) :
+        # the old 3calibrate-hmc5883l.py answer, for comparison
+        return [(lo + hi) / 2.0 for lo, hi in zip(self.min, self.max)]
+
+    def save(self, address=0x1E, bus=None) :
+        offset, matrix = self.solve()
+        store.put('hmc5883l', store.chip_key('hmc5883l', address, bus),
+                  {'offset': offset, 'matrix': matrix, 'samples': self.count})
+        return offset, matrix
+
+
+def load(address=0x1E, bus=None):
+    # (offset, matrix) saved for the chip, or None
+    cal = store.get('hmc5883l', store.chip_key('hmc5883l', address, bus))
+    if cal is None:
+        return None
+    return cal['offset'], cal['matrix']
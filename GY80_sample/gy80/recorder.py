@@ -0,0 +1,211 @@
+# Binary telemetry recorder: fixed-size records in a memory-mapped ring file.
+#
+# One print() per value costs more than the sensor reads on a Pi over SSH
+# and leaves nothing machine readable. TelemetryRecorder packs each tick
+# into one fixed-size record (struct) inside a memory-mapped file of fixed
+# capacity, overwriting the oldest records when full, so logging runs at
+# the full sample rate with constant memory and disk use. A background
+# thread flushes the mapping to disk every flush_interval seconds.
+#
+#     with TelemetryRecorder('flight.ring', capacity=1 << 20) as rec:
+#         for tick in loop:
+#             rec.record(time.monotonic_ns(), roll, pitch, tilt, heading, alt)
+#
+# TelemetryReader maps the same file read-only and exposes the records as
+# a NumPy structured array without copying:
+#
+#     with TelemetryReader('flight.ring') as r:
+#         data = r.records()      # oldest .. newest, a view into the file
+#         data['roll'].mean()
+#
+# The views are only valid until the reader is closed; copy what has to
+# outlive it.
+#
+# File layout: a HEADER_SIZE byte header (magic, version, record size,
+# capacity, total records written, field spec) followed by the ring.
+#
+# An existing file with the same layout is continued, so a restart after a
+# crash or reboot appends to the previous run's log instead of wiping it.
+# A file with another layout is kept as <path>.old. append=False always
+# starts an empty ring.
+
+import mmap
+import os
+import struct
+import threading
+
+MAGIC = b'GY80RING'
+VERSION = 1
+HEADER_SIZE = 4096
+_HEADER = struct.Struct('<8sIII')        # magic, version, record size, capacity
+_COUNT = struct.Struct('<Q')             # total records written so far
+_COUNT_OFFSET = _HEADER.size
+_FIELDS_OFFSET = _COUNT_OFFSET + _COUNT.size
+
+# (name, struct code) of the drone_info.py telemetry record
+TELEMETRY_FIELDS = (
+    ('t_ns', 'q'),
+    ('roll', 'f'),
+    ('pitch', 'f'),
+    ('tilt', 'f'),
+    ('heading', 'f'),
+    ('altitude', 'f'),
+)
+
+
+def _format(fields):
+    return '<' + ''.join(code for name, code in fields)
+
+
+def _encode_fields(fields):
+    return ','.join('%s:%s' % f for f in fields).encode('ascii')
+
+
+def _decode_fields(raw):
+    spec = raw.rstrip(b'\0').decode('ascii')
+    return tuple(tuple(item.split(':')) for item in spec.split(','))
+
+
+class TelemetryRecorder(object):
+
+    def __init__(self, path, capacity=65536, fields=TELEMETRY_FIELDS, flush_interval=1.0, append=True) :
+        self.path = path
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._struct = struct.Struct(_format(self.fields))
+        self.record_size = self._struct.size
+
+        spec = _encode_fields(self.fields)
+        if _FIELDS_OFFSET + len(spec) > HEADER_SIZE:
+            raise ValueError("too many fields for the %d byte header" % HEADER_SIZE)
+
+        size = HEADER_SIZE + capacity * self.record_size
+        resume = append and self._matches(path, size, spec)
+        if not resume and append and os.path.exists(path):
+            os.replace(path, path + '.old')
+        self._file = open(path, 'r+b' if resume else 'w+b')
+        if not resume:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        if resume:
+            self.count = _COUNT.unpack_from(self._mm, _COUNT_OFFSET)[0]
+        else:
+            _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, self.record_size, capacity)
+            _COUNT.pack_into(self._mm, _COUNT_OFFSET, 0)
+            self._mm[_FIELDS_OFFSET:_FIELDS_OFFSET + len(spec)] = spec
+            self.count = 0
+
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, name='gy80-recorder-flush')
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _matches(self, path, size, spec) :
+        # True if path is a ring file with exactly this layout
+        try:
+            if os.path.getsize(path) != size:
+                return False
+            with open(path, 'rb') as f:
+                header = f.read(HEADER_SIZE)
+        except OSError:
+            return False
+        if len(header) < HEADER_SIZE:
+            return False
+        if _HEADER.unpack_from(header, 0) != (MAGIC, VERSION, self.record_size, self.capacity):
+            return False
+        return header[_FIELDS_OFFSET:].rstrip(b'\0') == spec
+
+    def record(self, *values) :
+        # write one record; the count is published after the data so a
+        # concurrent reader never sees a half written record as valid
+        n = self.count
+        self._struct.pack_into(self._mm, HEADER_SIZE + (n % self.capacity) * self.record_size, *values)
+        self.count = n + 1
+        _COUNT.pack_into(self._mm, _COUNT_OFFSET, self.count)
+
+    def flush(self) :
+        self._mm.flush()
+
+    def _flush_loop(self) :
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) :
+        if self._mm is None:
+            return
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
+        self._mm = None
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc) :
+        self.close()
+        return False
+
+
+class TelemetryReader(object):
+
+    def __init__(self, path) :
+        import numpy as np
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, capacity = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a gy80 telemetry ring file" % path)
+        self.capacity = capacity
+        self.fields = _decode_fields(self._mm[_FIELDS_OFFSET:HEADER_SIZE])
+        self.dtype = np.dtype([(name, '<' + code) for name, code in self.fields])
+        if self.dtype.itemsize != record_size:
+            raise ValueError("%s: record size mismatch" % path)
+        # zero-copy view of the whole ring, in file order
+        self.ring = np.frombuffer(self._mm, dtype=self.dtype, count=capacity, offset=HEADER_SIZE)
+
+    def count(self) :
+        # total records written (may exceed capacity)
+        return _COUNT.unpack_from(self._mm, _COUNT_OFFSET)[0]
+
+    def records(self) :
+        # valid records, oldest first. A view while the ring has not
+        # wrapped yet, one copy (to put it in order) afterwards.
+        import numpy as np
+        n = self.count()
+        if n <= self.capacity:
+            return self.ring[:n]
+        start = n % self.capacity
+        return np.concatenate((self.ring[start:], self.ring[:start]))
+
+    def latest(self, k) :
+        # last k records, oldest first
+        return self.records()[-k:]
+
+    def close(self) :
+        # Arrays from records() / latest() are views into the mapping and
+        # must not be used after close(). If any are still referenced the
+        # mapping cannot be closed yet; it is then left to the garbage
+        # collector, which unmaps it once the last view is gone.
+        if self._mm is None:
+            return
+        self.ring = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._mm = None
+        self._file.close()
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc) :
+        self.close()
+        return False
@@ -0,0 +1,347 @@
+# Replay recorded IMU logs through the decoding and fusion stages.
+#
+# Instead of shaking the board to try a filter setting, record once and
+# replay as often as needed, much faster than real time:
+#
+#     python -m gy80.replay flight.csv --out trace.csv
+#     python -m gy80.replay flight.csv --raw --binary flight.ring    # convert
+#     python -m gy80.replay flight.ring --filter mahony --kp 2.0
+#
+# A log has one row per IMU sample with the columns
+#
+#     t_ns (or t in seconds), ax ay az, gx gy gz, [mx my mz], [alt]
+#
+# either as engineering units (acc in g, gyro in dps, mag in any unit) or,
+# with --raw, as the raw register counts. Raw logs go through the same
+# decoding as the drivers' getXYZ (gy80.fifo.units), using the stored
+# calibration profiles and the ranges the board ran with (--gyro-range,
+# --accel-range, --no-full-res; the counts mean nothing without them).
+# alt is the barometer altitude in m, left empty (NaN) on rows without a
+# new reading.
+#
+# The compact binary format is a telemetry ring file (gy80.recorder) with
+# the columns above as fields, int16 counts for raw logs, float32 for
+# units. It is memory mapped on replay, so loading costs nothing.
+#
+# The log is processed in chunks of --chunk rows: decoding, the
+# accelerometer angles and the heading (tilt compensated with the fused
+# roll / pitch, like drone_info.py) are vectorised (gy80.batch), the
+# quaternion filter and the altitude filter run sample by sample. The
+# trace (one row per sample) goes to --out as CSV and the throughput per
+# stage is reported at the end.
+
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from . import batch
+from .altitude import AltitudeFilter, vertical_acceleration
+from .constants import EARTH_GRAVITY_MS2
+from .fifo import units
+from .recorder import MAGIC, TelemetryRecorder, TelemetryReader
+
+ACC = ('ax', 'ay', 'az')
+GYRO = ('gx', 'gy', 'gz')
+MAG = ('mx', 'my', 'mz')
+
+TRACE_COLUMNS = ('t_ns', 'acc_pitch', 'acc_roll', 'tilt', 'heading',
+                 'roll', 'pitch', 'yaw', 'altitude')
+
+STAGES = ('read', 'decode', 'angles', 'fusion', 'altitude', 'write')
+
+
+def _stack(columns, names):
+    return np.column_stack([columns[n] for n in names])
+
+
+def log_fields(columns, raw):
+    # telemetry ring fields for a log with these columns
+    code = 'h' if raw else 'f'
+    fields = [('t_ns', 'q')]
+    for names in (ACC, GYRO, MAG):
+        if names[0] in columns:
+            fields.extend((n, code) for n in names)
+    if 'alt' in columns:
+        fields.append(('alt', 'f'))
+    return tuple(fields)
+
+
+def _is_ring(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _read_ring(path, chunk):
+    reader = TelemetryReader(path)
+    try:
+        records = reader.records()
+        raw = records.dtype['ax'].kind == 'i'
+        for start in range(0, len(records), chunk):
+            # views into the mapping, consumed before the next chunk
+            part = records[start:start + chunk]
+            yield dict((n, part[n]) for n in records.dtype.names), raw
+    finally:
+        reader.close()
+
+
+def _read_csv(path, chunk, raw, rate):
+    with open(path) as f:
+        rows = csv.reader(f)
+        header = [h.strip() for h in next(rows)]
+        index = 0
+        while True:
+            block = []
+            for row in rows:
+                if row:
+                    block.append([float(v) if v.strip() else np.nan for v in row])
+                    if len(block) == chunk:
+                        break
+            if not block:
+                return
+            data = np.array(block)
+            columns = dict((h, data[:, i]) for i, h in enumerate(header))
+            if 't_ns' in columns:
+                columns['t_ns'] = columns['t_ns'].astype(np.int64)
+            elif 't' in columns:
+                columns['t_ns'] = np.round(columns.pop('t') * 1e9).astype(np.int64)
+            else:
+                columns['t_ns'] = ((index + np.arange(len(block))) * (1e9 / rate)).astype(np.int64)
+            index += len(block)
+            yield columns, raw
+
+
+def read_log(path, chunk=65536, raw=False, rate=100.0):
+    # generator of (columns, raw) chunks; columns maps name -> (n,) array.
+    # A ring file says itself whether it is raw, for CSV pass raw.
+    # rate is only used when the CSV has no time column.
+    if _is_ring(path):
+        return _read_ring(path, chunk)
+    return _read_csv(path, chunk, raw, rate)
+
+
+def to_binary(path, out, raw=False, rate=100.0):
+    # convert a CSV log to the binary (ring file) format, returns the rows
+    n = 0
+    fields = None
+    for columns, raw in read_log(path, raw=raw, rate=rate):
+        n += len(columns['t_ns'])
+        fields = fields or log_fields(columns, raw)
+    if fields is None:
+        raise ValueError("%s has no samples" % path)
+    with TelemetryRecorder(out, capacity=n, fields=fields, flush_interval=0, append=False) as rec:
+        for columns, raw in read_log(path, raw=raw, rate=rate):
+            cast = [columns[name].astype(np.int64 if code in 'qh' else np.float64).tolist()
+                    for name, code in fields]
+            for row in zip(*cast):
+                rec.record(*row)
+    return n
+
+
+class Decoder(object):
+    # raw counts -> units with the drivers' scale and calibration. The
+    # drivers are created on a simulated bus unless given, so the stored
+    # calibration profiles apply exactly as on the board. The scales
+    # depend on the ranges the log was recorded with: gyro_range (dps),
+    # accel_range (g) and full_res must match the board's settings.
+
+    def __init__(self, accel=None, gyro=None, compass=None,
+                 gyro_range=250, accel_range=2, full_res=True) :
+        if accel is None or gyro is None or compass is None:
+            from .sim import SimBus, Still
+            bus = SimBus(motion=Still(), noise=False)
+            # the drivers only decode here: load the board's profiles
+            bus.BACKEND = 'smbus'
+        if accel is None:
+            from .adxl345 import ADXL345
+            accel = ADXL345(bus, g_range=accel_range, full_res=full_res)
+        if gyro is None:
+            from .l3g4200d import L3G4200D
+            gyro = L3G4200D(bus, full_scale=gyro_range)
+        if compass is None:
+            from .hmc5883l import HMC5883L
+            compass = HMC5883L(bus)
+        self.accel = accel
+        self.gyro = gyro
+        self.compass = compass
+
+    def decode(self, columns, raw) :
+        # (acc g, gyro dps, mag or None) as (n, 3) arrays
+        acc = _stack(columns, ACC).astype(np.float64)
+        gyro = _stack(columns, GYRO).astype(np.float64)
+        mag = _stack(columns, MAG).astype(np.float64) if 'mx' in columns else None
+        if raw:
+            acc = units(self.accel, acc)
+            gyro = units(self.gyro, gyro)
+            if mag is not None:
+                mag = units(self.compass, mag)
+        return acc, gyro, mag
+
+
+class Replay(object):
+
+    def __init__(self, ahrs, decoder=None, declination=None, altitude=None) :
+        self.ahrs = ahrs
+        self.decoder = decoder if decoder is not None else Decoder()
+        if declination is None:
+            # the compass driver's, as drone_info.py uses (it is in radians)
+            declination = math.degrees(self.decoder.compass.angle_offset)
+        self.declination = declination
+        self.altitude = altitude if altitude is not None else AltitudeFilter()
+        self.times = dict((s, 0.0) for s in STAGES)
+        self.samples = 0
+        self.t_first = None
+        self.t_last = None
+
+    def process(self, columns, raw) :
+        # one chunk -> dict of TRACE_COLUMNS arrays
+        clock = time.perf_counter
+        t0 = clock()
+        acc, gyro, mag = self.decoder.decode(columns, raw)
+        t1 = clock()
+
+        acc_pitch, acc_roll, tilt = batch.attitude(acc)
+        t2 = clock()
+
+        t_ns = np.asarray(columns['t_ns'], dtype=np.int64)
+        prev = self.t_last if self.t_last is not None else t_ns[0]
+        dt = np.diff(t_ns, prepend=prev) * 1e-9
+        q = self.ahrs.run(acc, gyro, mag, dt)
+        roll, pitch, yaw = batch.euler(q)
+        t3 = clock()
+
+        # tilt compensated with the fused roll / pitch, as in drone_info.py
+        if mag is not None:
+            heading = batch.heading(mag, pitch, roll, self.declination)
+        else:
+            heading = np.full(len(acc), np.nan)
+        t4 = clock()
+
+        altitude = np.full(len(acc), np.nan)
+        if 'alt' in columns:
+            # acc is in g here
+            up = (vertical_acceleration(q.T, acc.T, gravity=1.0) * EARTH_GRAVITY_MS2).tolist()
+            baro = np.asarray(columns['alt'], dtype=np.float64).tolist()
+            dts = dt.tolist()
+            f = self.altitude
+            for i in range(len(baro)):
+                f.predict(up[i], dts[i])
+                if baro[i] == baro[i]:          # not NaN: a new reading
+                    f.correct(baro[i])
+                if f.altitude is not None:
+                    altitude[i] = f.altitude
+        t5 = clock()
+
+        self.times['decode'] += t1 - t0
+        self.times['angles'] += (t2 - t1) + (t4 - t3)
+        self.times['fusion'] += t3 - t2
+        self.times['altitude'] += t5 - t4
+        self.samples += len(t_ns)
+        if self.t_first is None:
+            self.t_first = int(t_ns[0])
+        self.t_last = int(t_ns[-1])
+        return {
+            't_ns': t_ns, 'acc_pitch': acc_pitch, 'acc_roll': acc_roll, 'tilt': tilt,
+            'heading': heading, 'roll': roll, 'pitch': pitch, 'yaw': yaw, 'altitude': altitude,
+        }
+
+    def run(self, chunks, out=None) :
+        # chunks from read_log(); out: file for the CSV trace or None
+        writer = None
+        if out is not None:
+            writer = csv.writer(out)
+            writer.writerow(TRACE_COLUMNS)
+        clock = time.perf_counter
+        t_start = clock()
+        t_read = clock()
+        for columns, raw in chunks:
+            self.times['read'] += clock() - t_read
+            trace = self.process(columns, raw)
+            t_write = clock()
+            if writer is not None:
+                cols = [trace[c].tolist() for c in TRACE_COLUMNS]
+                writer.writerows(zip(*cols))
+            self.times['write'] += clock() - t_write
+            t_read = clock()
+        self.wall = clock() - t_start
+        return self.report()
+
+    def report(self) :
+        duration = (self.t_last - self.t_first) * 1e-9 if self.samples else 0.0
+        wall = getattr(self, 'wall', sum(self.times.values()))
+        return {
+            'samples': self.samples,
+            'log_seconds': duration,
+            'wall_seconds': wall,
+            'samples_per_s': self.samples / wall if wall else 0.0,
+            'realtime_factor': duration / wall if wall else 0.0,
+            'stage_seconds': dict(self.times),
+        }
+
+
+def format_report(report):
+    lines = ["%d samples, %.1f s of log replayed in %.2f s: %.0f samples/s, %.0fx real time"
+             % (report['samples'], report['log_seconds'], report['wall_seconds'],
+                report['samples_per_s'], report['realtime_factor'])]
+    for stage in STAGES:
+        lines.append("  %-9s %8.3f s" % (stage, report['stage_seconds'][stage]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    from .adxl345 import ADXL345_RANGES
+    from .fusion import Madgwick, Mahony
+    from .l3g4200d import L3G4200D_RANGES
+    parser = argparse.ArgumentParser(description="Replay a recorded GY-80 log through decoding and fusion")
+    parser.add_argument('log', help="CSV or binary (ring file) log")
+    parser.add_argument('--raw', action='store_true', help="the CSV holds raw register counts")
+    parser.add_argument('--rate', type=float, default=100.0, help="sample rate if the CSV has no time column")
+    parser.add_argument('--gyro-range', type=int, default=250, choices=sorted(L3G4200D_RANGES),
+                        help="L3G4200D full scale (dps) a raw log was recorded with")
+    parser.add_argument('--accel-range', type=int, default=2, choices=sorted(ADXL345_RANGES),
+                        help="ADXL345 range (g) a raw log was recorded with")
+    parser.add_argument('--no-full-res', dest='full_res', action='store_false',
+                        help="the raw ADXL345 counts are 10 bit (FULL_RES off)")
+    parser.add_argument('--chunk', type=int, default=65536, help="rows per processing chunk")
+    parser.add_argument('--filter', choices=('madgwick', 'mahony'), default='madgwick')
+    parser.add_argument('--beta', type=float, default=0.1, help="Madgwick gain")
+    parser.add_argument('--kp', type=float, default=1.0, help="Mahony proportional gain")
+    parser.add_argument('--ki', type=float, default=0.0, help="Mahony integral gain")
+    parser.add_argument('--declination', type=float, default=None,
+                        help="degrees added to the heading (default: the HMC5883L driver's)")
+    parser.add_argument('--out', help="write the trace to this CSV file")
+    parser.add_argument('--json', help="write the throughput report to this file")
+    parser.add_argument('--binary', help="only convert the CSV log to this binary file")
+    args = parser.parse_args(argv)
+
+    if args.binary:
+        n = to_binary(args.log, args.binary, args.raw, args.rate)
+        print("%d samples written to %s" % (n, args.binary))
+        return 0
+
+    if args.filter == 'madgwick':
+        ahrs = Madgwick(beta=args.beta)
+    else:
+        ahrs = Mahony(kp=args.kp, ki=args.ki)
+    decoder = Decoder(gyro_range=args.gyro_range, accel_range=args.accel_range, full_res=args.full_res)
+    replay = Replay(ahrs, decoder, declination=args.declination)
+    chunks = read_log(args.log, args.chunk, args.raw, args.rate)
+    if args.out:
+        with open(args.out, 'w', newline='') as out:
+            report = replay.run(chunks, out)
+    else:
+        report = replay.run(chunks)
+    print(format_report(report))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
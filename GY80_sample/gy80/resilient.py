@@ -0,0 +1,194 @@
+# Riding through flaky I2C transactions.
+#
+# ResilientBus wraps the bus. A failed transaction is retried a bounded
+# number of times straight away (most glitches are single NACKs). If it
+# still fails, the device is marked down and, for an exponentially growing
+# backoff, every call for it fails at once with DeviceUnavailable instead
+# of touching the bus, so a dead chip costs the loop nothing. When the
+# device answers again, or a transaction only went through on a retry, its
+# generation number goes up: a NACK can be the only sign of a brown-out
+# that reset the chip.
+#
+# SensorGuard wraps one driver. Its methods are the driver's methods, but
+# an I/O error returns the last good value instead of raising, with
+# guard.stale set until a read succeeds again. Before the first good value
+# there is nothing to repeat: a failed call then returns the method's entry
+# in defaults, None if it has none, so callers must expect None at
+# start-up. When the bus reports a new generation for the chip (it was
+# down or needed a retry, and a brown-out may have reset it to power-on
+# defaults) the guard calls the driver's reinit() and reads again.
+#
+#     bus = ResilientBus(get_bus())
+#     sensors = SensorSession(bus).open()
+#     acc = SensorGuard(sensors.accel)
+#     for tick in loop:
+#         xyz = acc.getXYZ()      # last good value if the read failed
+#         if xyz is None:         # no good read yet
+#             continue
+
+import errno
+import time
+
+
+class DeviceUnavailable(IOError):
+    # raised without bus traffic while a device is backing off
+    def __init__(self, address, retry_in) :
+        IOError.__init__(self, errno.EREMOTEIO,
+                         "device 0x%02x unavailable, retry in %.3f s" % (address, retry_in))
+        self.address = address
+
+
+class _DeviceState(object):
+
+    def __init__(self) :
+        self.failures = 0           # consecutive failed transactions
+        self.down_until = 0.0
+        self.backoff = 0.0
+        self.generation = 0
+        self.outages = 0
+
+
+class ResilientBus(object):
+
+    def __init__(self, bus, retries=2, backoff=0.05, max_backoff=2.0) :
+        self.bus = bus
+        self.retries = retries
+        self.base_backoff = backoff
+        self.max_backoff = max_backoff
+        self.devices = {}
+
+    def _state(self, address) :
+        st = self.devices.get(address)
+        if st is None:
+            st = self.devices.setdefault(address, _DeviceState())
+        return st
+
+    def generation(self, address) :
+        return self._state(address).generation
+
+    def available(self, address) :
+        return time.monotonic() >= self._state(address).down_until
+
+    def _call(self, address, call, *args) :
+        st = self._state(address)
+        if st.down_until:
+            now = time.monotonic()
+            if now < st.down_until:
+                raise DeviceUnavailable(address, st.down_until - now)
+        attempt = 0
+        while True:
+            try:
+                value = call(address, *args)
+                break
+            except (IOError, OSError):
+                if attempt >= self.retries or st.down_until:
+                    # out of retries, or still probing a device that was
+                    # down: back off (longer each time)
+                    st.failures += 1
+                    st.backoff = min(self.max_backoff, st.backoff * 2 or self.base_backoff)
+                    if not st.down_until:
+                        st.outages += 1
+                    st.down_until = time.monotonic() + st.backoff
+                    raise
+                attempt += 1
+                if hasattr(self.bus, 'retry'):
+                    self.bus.retry(address)
+        if st.down_until or attempt:
+            # back after an outage, or it needed a retry: the chip may have
+            # been reset, drivers should configure it again
+            st.down_until = 0.0
+            st.backoff = 0.0
+            st.generation += 1
+        st.failures = 0
+        return value
+
+    # ---- smbus interface ----
+    def read_byte_data(self, address, register) :
+        return self._call(address, self.bus.read_byte_data, register)
+
+    def write_byte_data(self, address, register, value) :
+        self._call(address, self.bus.write_byte_data, register, value)
+
+    def read_i2c_block_data(self, address, register, length=32) :
+        return self._call(address, self.bus.read_i2c_block_data, register, length)
+
+    def write_i2c_block_data(self, address, register, data) :
+        self._call(address, self.bus.write_i2c_block_data, register, data)
+
+    def retry(self, address) :
+        pass
+
+    def close(self) :
+        if hasattr(self.bus, 'close'):
+            self.bus.close()
+
+
+class SensorGuard(object):
+
+    # what a failed call always returns for methods whose result only
+    # means "something new"
+    NO_VALUE = {'poll': None, 'update': False}
+
+    def __init__(self, sensor, defaults=None) :
+        # defaults: method name -> value returned by a failed call before
+        # that method has succeeded once (None otherwise)
+        self.sensor = sensor
+        self.defaults = dict(defaults or {})
+        self.stale = False
+        self.errors = 0
+        self.reinits = 0
+        self.last_error = None
+        self.last_good = {}         # method name -> value
+        self.t_good = None          # time.monotonic() of the last good read
+        self._generation = self._busGeneration()
+
+    def _busGeneration(self) :
+        bus = self.sensor.bus
+        if hasattr(bus, 'generation'):
+            return bus.generation(self.sensor.ADDRESS)
+        return 0
+
+    def age(self) :
+        # seconds since the last good read
+        if self.t_good is None:
+            return None
+        return time.monotonic() - self.t_good
+
+    def _guarded(self, name, method) :
+        def call(*args, **kwargs):
+            try:
+                value = method(*args, **kwargs)
+                generation = self._busGeneration()
+                if generation != self._generation:
+                    # the chip may have lost its configuration: set it up
+                    # again and read once more. The generation is only
+                    # taken once that worked, so a failed reinit() is
+                    # repeated on the next call.
+                    self.reinits += 1
+                    self.sensor.reinit()
+                    value = method(*args, **kwargs)
+                    self._generation = generation
+            except (IOError, OSError) as e:
+                self.errors += 1
+                self.last_error = e
+                self.stale = True
+                if name in self.NO_VALUE:
+                    return self.NO_VALUE[name]
+                if name in self.last_good:
+                    return self.last_good[name]
+                return self.defaults.get(name)
+            self.stale = False
+            self.t_good = time.monotonic()
+            if name not in self.NO_VALUE:
+                self.last_good[name] = value
+            return value
+        return call
+
+    def __getattr__(self, name) :
+        attr = getattr(self.sensor, name)
+        if not callable(attr):
+            return attr
+        call = self._guarded(name, attr)
+        # cached so the wrapper is only built once per method
+        self.__dict__[name] = call
+        return call
@@ -0,0 +1,123 @@
+# Deadline based fixed-rate loop scheduler.
+#
+# A bare time.sleep(0.1) after the work makes the real period
+# 0.1 s + work time, so the rate drifts with I2C and print latency.
+# PeriodicScheduler sleeps until absolute deadlines instead
+# (t0, t0 + period, t0 + 2 * period, ...), so the cadence holds as long as
+# the work fits in one period:
+#
+#     loop = PeriodicScheduler(rate=200)
+#     for tick in loop:
+#         ... work ...
+#     print(loop.report())
+#
+# When the work overruns, the missed deadlines are counted and skipped
+# (the loop does not try to catch up with a burst of back to back ticks).
+# How late each wake-up was is kept in a histogram (LATE_BINS_US).
+
+import os
+import time
+
+# upper edges of the late wake-up histogram buckets, in us
+LATE_BINS_US = (50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+def set_realtime(cpu=None, priority=None):
+    # Optionally pin the process to one core and raise its scheduling
+    # priority (SCHED_FIFO needs root / CAP_SYS_NICE; without it we fall
+    # back to the best nice value we are allowed). Returns what was applied.
+    applied = {}
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, {cpu})
+            applied['cpu'] = cpu
+        except OSError:
+            pass
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            applied['fifo'] = priority
+        except (AttributeError, OSError):
+            try:
+                applied['nice'] = os.nice(-10)
+            except OSError:
+                pass
+    return applied
+
+
+class PeriodicScheduler(object):
+
+    def __init__(self, rate=None, period=None, cpu=None, priority=None) :
+        if period is None:
+            if not rate:
+                raise ValueError("need a rate (Hz) or a period (s)")
+            period = 1.0 / rate
+        self.period = period
+        self.realtime = set_realtime(cpu, priority)
+        self.reset()
+
+    def reset(self) :
+        self.ticks = 0
+        self.overruns = 0           # ticks where the work missed a deadline
+        self.missed = 0             # deadlines skipped because of overruns
+        self.max_late = 0.0         # worst wake-up lateness, s
+        self.late_hist = [0] * (len(LATE_BINS_US) + 1)
+        self._deadline = None
+
+    def start(self) :
+        self._deadline = time.monotonic()
+        return self
+
+    def wait(self) :
+        # sleep until the next deadline, returns the tick number
+        if self._deadline is None:
+            self.start()
+        else:
+            self._deadline += self.period
+            now = time.monotonic()
+            if now > self._deadline:
+                # the work took longer than one period
+                self.overruns += 1
+                skipped = int((now - self._deadline) / self.period)
+                self.missed += skipped
+                self._deadline += skipped * self.period
+            remaining = self._deadline - now
+            if remaining > 0:
+                time.sleep(remaining)
+            self._record_late(time.monotonic() - self._deadline)
+        self.ticks += 1
+        return self.ticks - 1
+
+    def __iter__(self) :
+        while True:
+            yield self.wait()
+
+    def _record_late(self, late) :
+        if late > self.max_late:
+            self.max_late = late
+        late_us = late * 1e6
+        for i, edge in enumerate(LATE_BINS_US):
+            if late_us <= edge:
+                self.late_hist[i] += 1
+                return
+        self.late_hist[-1] += 1
+
+    def stats(self) :
+        return {
+            'rate': 1.0 / self.period,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'missed': self.missed,
+            'max_late': self.max_late,
+            'late_hist': dict(zip(['<=%dus' % b for b in LATE_BINS_US] + ['>%dus' % LATE_BINS_US[-1]],
+                                  self.late_hist)),
+        }
+
+    def report(self) :
+        s = self.stats()
+        lines = ["%.1f Hz: %d ticks, %d overruns, %d missed, max late %.3f ms"
+                 % (s['rate'], s['ticks'], s['overruns'], s['missed'], s['max_late'] * 1e3)]
+        for name, count in s['late_hist'].items():
+            if count:
+                lines.append("   late %-9s %d" % (name, count))
+        return "\n".join(lines)
@@ -0,0 +1,58 @@
+from .bus import get_bus
+
+
+class SensorSession(object):
+    # Long-lived handle on the GY-80 chips.
+    #
+    # open() configures each requested chip once (and loads the BMP180
+    # calibration once); the loop then only pays for data reads. close()
+    # puts the chips back into their low power modes.
+    #
+    #     with SensorSession() as s:
+    #         while 1:
+    #             s.accel.getXYZ()
+
+    def __init__(self, bus=None, accel=True, gyro=True, compass=True, baro=True) :
+        self.bus = bus
+        self.enabled = {'accel': accel, 'gyro': gyro, 'compass': compass, 'baro': baro}
+        self.accel = None
+        self.gyro = None
+        self.compass = None
+        self.baro = None
+        self.is_open = False
+
+    def open(self) :
+        if self.is_open:
+            return self
+        if self.bus is None:
+            self.bus = get_bus()
+        if self.enabled['accel']:
+            from .adxl345 import ADXL345
+            self.accel = ADXL345(self.bus)
+        if self.enabled['gyro']:
+            from .l3g4200d import L3G4200D
+            self.gyro = L3G4200D(self.bus)
+        if self.enabled['compass']:
+            from .hmc5883l import HMC5883L
+            self.compass = HMC5883L(self.bus)
+        if self.enabled['baro']:
+            from .bmp180 import BMP180
+            self.baro = BMP180(self.bus)
+        self.is_open = True
+        return self
+
+    def close(self) :
+        if not self.is_open:
+            return
+        for sensor in (self.accel, self.gyro, self.compass):
+            if sensor is not None:
+                sensor.powerDown()
+        self.accel = self.gyro = self.compass = self.baro = None
+        self.is_open = False
+
+    def __enter__(self) :
+        return self.open()
+
+    def __exit__(self, *exc) :
+        self.close()
+        return False
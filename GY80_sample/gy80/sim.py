@@ -0,0 +1,643 @@
+# Register level simulator of the GY-80 board.
+#
+# SimBus has the same methods as smbus.SMBus, and behind it sit simulated
+# ADXL345, L3G4200D, HMC5883L and BMP180 chips with their register maps,
+# so the real drivers run unchanged on any Linux box:
+#
+#     from gy80 import set_bus, SensorSession
+#     from gy80.sim import SimBus, Wobble
+#     set_bus(SimBus(motion=Wobble(roll=20, freq=0.5), latency=150e-6))
+#     session = SensorSession().open()
+#
+# The chips derive their output from a motion profile (attitude, body
+# rates and altitude as a function of time), add Gaussian noise and a gyro
+# bias, and emulate the data-ready flags and the ADXL345 / L3G4200D FIFOs
+# at the configured output data rate. Bus latency is charged per
+# transaction and per byte, with a busy wait so that sub-millisecond
+# latencies are honoured.
+#
+# TraceBus records every transaction of another bus (e.g. the real one on
+# a Pi) and ReplayBus plays such a trace back, so a session recorded on
+# hardware can be re-run off-Pi.
+
+import collections
+import json
+import random
+import time
+from math import sin, cos, radians, pi
+
+from .constants import EARTH_GRAVITY_MS2, STANDARD_PRESSURE
+
+EREMOTEIO = 121         # what smbus raises for an address nobody answers
+
+
+def _nack(address):
+    return IOError(EREMOTEIO, "Remote I/O error (no device at 0x%02x)" % address)
+
+
+def _busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def to_body(v, roll, pitch, yaw):
+    # rotate a world frame vector into the body frame (Z-Y-X Euler, rad)
+    x, y, z = v
+    cy, sy = cos(yaw), sin(yaw)
+    x, y = cy * x + sy * y, -sy * x + cy * y
+    cp, sp = cos(pitch), sin(pitch)
+    x, z = cp * x - sp * z, sp * x + cp * z
+    cr, sr = cos(roll), sin(roll)
+    y, z = cr * y + sr * z, -sr * y + cr * z
+    return x, y, z
+
+
+def _int16(value):
+    value = int(round(value))
+    if value > 32767:
+        return 32767
+    if value < -32768:
+        return -32768
+    return value
+
+
+def _le(value):
+    value &= 0xFFFF
+    return [value & 0xFF, value >> 8]
+
+
+def _be(value):
+    value &= 0xFFFF
+    return [value >> 8, value & 0xFF]
+
+
+# ---------------------------------------------------------------------------
+# motion profiles
+
+class Motion(object):
+    # Board held still, level, at a fixed altitude. Subclasses override
+    # attitude() (deg), rates() (body rates, dps) and altitude() (m).
+
+    def __init__(self, roll=0.0, pitch=0.0, yaw=0.0, altitude=0.0) :
+        self.roll = roll
+        self.pitch = pitch
+        self.yaw = yaw
+        self.alt = altitude
+
+    def attitude(self, t) :
+        return self.roll, self.pitch, self.yaw
+
+    def rates(self, t) :
+        return 0.0, 0.0, 0.0
+
+    def altitude(self, t) :
+        return self.alt
+
+    def accel(self, t) :
+        # linear acceleration in the world frame, m/s2 (without gravity)
+        return 0.0, 0.0, 0.0
+
+
+Still = Motion
+
+
+class Wobble(Motion):
+    # Sinusoidal roll / pitch / yaw (amplitudes in deg) and altitude
+    # (amplitude in m) around a base attitude. The body rates are the Euler
+    # angle derivatives, which is exact for one axis at a time and close
+    # enough for small combined angles.
+
+    def __init__(self, roll=10.0, pitch=0.0, yaw=0.0, freq=0.5,
+                 altitude=0.0, climb=0.0, base=(0.0, 0.0, 0.0)) :
+        Motion.__init__(self, altitude=altitude)
+        self.amp = (roll, pitch, yaw)
+        self.freq = freq
+        self.climb = climb
+        self.base = base
+
+    def attitude(self, t) :
+        s = sin(2 * pi * self.freq * t)
+        return tuple(b + a * s for a, b in zip(self.amp, self.base))
+
+    def rates(self, t) :
+        c = 2 * pi * self.freq * cos(2 * pi * self.freq * t)
+        return tuple(a * c for a in self.amp)
+
+    def altitude(self, t) :
+        return self.alt + self.climb * sin(2 * pi * self.freq * t)
+
+    def accel(self, t) :
+        w = 2 * pi * self.freq
+        return 0.0, 0.0, -self.climb * w * w * sin(w * t)
+
+
+class Spin(Motion):
+    # constant body rates (dps) starting from a level attitude
+
+    def __init__(self, rates=(0.0, 0.0, 30.0), altitude=0.0) :
+        Motion.__init__(self, altitude=altitude)
+        self.spin = tuple(rates)
+
+    def attitude(self, t) :
+        return tuple(r * t for r in self.spin)
+
+    def rates(self, t) :
+        return self.spin
+
+
+# ---------------------------------------------------------------------------
+# chips
+
+class SimDevice(object):
+
+    ADDRESS = None
+
+    def __init__(self, board) :
+        self.board = board
+        self.regs = bytearray(256)
+
+    def write(self, reg, value) :
+        self.regs[reg] = value & 0xFF
+
+    def read(self, reg, length) :
+        return [self.regs[(reg + i) & 0xFF] for i in range(length)]
+
+    def noise(self, sigma) :
+        return self.board.rng.gauss(0.0, sigma) if sigma else 0.0
+
+
+class _FifoMixin(object):
+    # Emulated 32 sample stream-mode FIFO, filled at self.rate() samples/s.
+
+    FIFO_SIZE = 32
+
+    def _fifoReset(self, t) :
+        self._fifo_t = t
+
+    def fifoEntries(self, t) :
+        entries = int((t - self._fifo_t) * self.rate())
+        if entries > self.FIFO_SIZE:
+            # overflow: the oldest samples are gone
+            self._fifo_t = t - float(self.FIFO_SIZE) / self.rate()
+            self.overrun = True
+            entries = self.FIFO_SIZE
+        return entries
+
+    def _fifoPop(self, t) :
+        if self.fifoEntries(t) > 0:
+            self._fifo_t += 1.0 / self.rate()
+
+
+class SimADXL345(SimDevice, _FifoMixin):
+
+    ADDRESS = 0x53
+    RATES = {0x0F: 3200, 0x0E: 1600, 0x0D: 800, 0x0C: 400, 0x0B: 200,
+             0x0A: 100, 0x09: 50, 0x08: 25, 0x07: 12.5, 0x06: 6.25}
+
+    def __init__(self, board, noise=0.004, offset=(0.0, 0.0, 0.0)) :
+        SimDevice.__init__(self, board)
+        self.sigma = noise          # g
+        self.offset = offset        # g
+        self.overrun = False
+        self.regs[0x00] = 0xE5      # DEVID
+        self.regs[0x2C] = 0x0A      # BW_RATE, 100 Hz
+        self._fifoReset(0.0)
+
+    def rate(self) :
+        return self.RATES.get(self.regs[0x2C] & 0x0F, 100)
+
+    def scale(self) :
+        # g/LSB from DATA_FORMAT
+        fmt = self.regs[0x31]
+        if fmt & 0x08:
+            return 1.0 / 256
+        return (4 << (fmt & 0x03)) / 1024.0     # 10 bits over the +/- range
+
+    def write(self, reg, value) :
+        SimDevice.write(self, reg, value)
+        if reg == 0x38:
+            self._fifoReset(self.board.now())
+
+    def sample(self, t) :
+        m = self.board.motion
+        roll, pitch, yaw = (radians(a) for a in m.attitude(t))
+        lin = to_body(m.accel(t), roll, pitch, yaw)
+        g = to_body((0.0, 0.0, 1.0), roll, pitch, yaw)
+        scale = self.scale()
+        return [_int16((g[i] + lin[i] / EARTH_GRAVITY_MS2 + self.offset[i] + self.noise(self.sigma)) / scale)
+                for i in range(3)]
+
+    def read(self, reg, length) :
+        t = self.board.now()
+        fifo = self.regs[0x38] & 0xC0
+        if reg == 0x39:
+            self.regs[0x39] = min(self.fifoEntries(t), 0x3F) if fifo else 0
+        elif reg == 0x30:
+            self.regs[0x30] = 0x80 | (0x01 if self.overrun else 0)     # DATA_READY, OVERRUN
+            self.overrun = False
+        if 0x32 <= reg <= 0x37:
+            out = []
+            for v in self.sample(t):
+                out.extend(_le(v))
+            self.regs[0x32:0x38] = bytearray(out)
+            if fifo and reg == 0x32 and length >= 6:
+                self._fifoPop(t)
+        return SimDevice.read(self, reg, length)
+
+
+class SimL3G4200D(SimDevice, _FifoMixin):
+
+    ADDRESS = 0x69
+    RATES = (100, 200, 400, 800)
+    SENSITIVITY = (0.00875, 0.0175, 0.07, 0.07)      # dps/digit by FS1-FS0
+
+    def __init__(self, board, noise=0.05, bias=(0.3, -0.2, 0.1)) :
+        SimDevice.__init__(self, board)
+        self.sigma = noise          # dps
+        self.bias = bias            # dps
+        self.overrun = False
+        self.regs[0x0F] = 0xD3      # WHO_AM_I
+        self.regs[0x20] = 0x07      # CTRL_REG1, power down
+        self._fifoReset(0.0)
+
+    def rate(self) :
+        return self.RATES[self.regs[0x20] >> 6]
+
+    def gain(self) :
+        return self.SENSITIVITY[(self.regs[0x23] >> 4) & 0x03]
+
+    def fifoEnabled(self) :
+        return (self.regs[0x24] & 0x40) and (self.regs[0x2E] & 0xE0)
+
+    def write(self, reg, value) :
+        SimDevice.write(self, reg & 0x7F, value)
+        if (reg & 0x7F) in (0x24, 0x2E):
+            self._fifoReset(self.board.now())
+
+    def sample(self, t) :
+        rates = self.board.motion.rates(t)
+        gain = self.gain()
+        return [_int16((rates[i] + self.bias[i] + self.noise(self.sigma)) / gain) for i in range(3)]
+
+    def _sampleBytes(self, t) :
+        out = []
+        for v in self.sample(t):
+            out.extend(_le(v))
+        return out
+
+    def read(self, reg, length) :
+        increment = reg & 0x80
+        reg &= 0x7F
+        t = self.board.now()
+        if reg == 0x2F:
+            entries = self.fifoEntries(t) if self.fifoEnabled() else 0
+            src = min(entries, 31)
+            if entries == 0:
+                src |= 0x20                     # EMPTY
+            if self.overrun:
+                src |= 0x40                     # OVRN
+                self.overrun = False
+            self.regs[0x2F] = src
+        elif reg == 0x27:
+            self.regs[0x27] = 0x0F              # ZYXDA and friends
+        if not 0x28 <= reg <= 0x2D:
+            if not increment:
+                return [self.regs[reg]] * length
+            return SimDevice.read(self, reg, length)
+
+        # data registers: with the FIFO on the pointer wraps 0x2D -> 0x28
+        # and every 6 bytes pop one sample
+        fifo = self.fifoEnabled()
+        data = self._sampleBytes(t)
+        out = []
+        pos = reg - 0x28
+        for i in range(length):
+            out.append(data[pos])
+            if increment:
+                pos += 1
+            if pos == 6:
+                pos = 0
+                if fifo:
+                    self._fifoPop(t)
+                    data = self._sampleBytes(t)
+        self.regs[0x28:0x2E] = bytearray(data)
+        return out
+
+
+class SimHMC5883L(SimDevice):
+
+    ADDRESS = 0x1E
+    GAIN = (1370, 1090, 820, 660, 440, 390, 330, 230)          # LSB/Gauss by GN2-GN0
+    RATES = (0.75, 1.5, 3.0, 7.5, 15.0, 30.0, 75.0, 75.0)     # Hz by DO2-DO0
+
+    def __init__(self, board, field=(0.20, 0.0, 0.35), noise=0.002, hard_iron=(0.0, 0.0, 0.0)) :
+        SimDevice.__init__(self, board)
+        self.field = field          # earth field in the world frame, Gauss
+        self.sigma = noise
+        self.hard_iron = hard_iron  # Gauss, added in the body frame
+        self.regs[0x00] = 0x10
+        self.regs[0x01] = 0x20
+        self.regs[0x02] = 0x01      # single-measurement (idle after power on)
+        self.regs[0x0A:0x0D] = b'H43'
+        # continuous mode converts on the chip's own clock, one sample every
+        # 1/rate s from _t0, whenever it is read
+        self._t0 = 0.0
+        self._latched = 0           # conversions since _t0 at the last read
+        self._single_at = None      # when a triggered single measurement is done
+
+    def write(self, reg, value) :
+        SimDevice.write(self, reg, value)
+        if reg == 0x02 and value & 0x03 == 0x01:
+            # single measurement, ready after one conversion (~6 ms)
+            self._single_at = self.board.now() + 0.006
+        elif reg in (0x00, 0x02):
+            # (re)starts the continuous conversions
+            self._t0 = self.board.now()
+            self._latched = 0
+
+    def _conversions(self, t) :
+        return int((t - self._t0) * self.rate())
+
+    def rate(self) :
+        return self.RATES[(self.regs[0x00] >> 2) & 0x07]
+
+    def ready(self, t) :
+        mode = self.regs[0x02] & 0x03
+        if mode == 0x00:
+            return self._conversions(t) > self._latched
+        return self._single_at is not None and t >= self._single_at
+
+    def sample(self, t) :
+        roll, pitch, yaw = (radians(a) for a in self.board.motion.attitude(t))
+        b = to_body(self.field, roll, pitch, yaw)
+        gain = self.GAIN[self.regs[0x01] >> 5]
+        x, y, z = [_int16((b[i] + self.hard_iron[i] + self.noise(self.sigma)) * gain) for i in range(3)]
+        return x, y, z
+
+    def read(self, reg, length) :
+        t = self.board.now()
+        if reg == 0x09:
+            self.regs[0x09] = 0x01 if self.ready(t) else 0x00      # RDY
+        elif 0x03 <= reg <= 0x08 and self.ready(t):
+            # a new measurement is latched into the data registers,
+            # otherwise the previous one is read again
+            x, y, z = self.sample(t)
+            self.regs[0x03:0x09] = bytearray(_be(x) + _be(z) + _be(y))
+            if self.regs[0x02] & 0x03 == 0x00:
+                self._latched = self._conversions(t)
+            else:
+                self._single_at = None
+                self.regs[0x02] = 0x03          # back to idle
+        out = []
+        for i in range(length):
+            r = reg + i
+            if r > 0x0C:
+                r -= 0x0D
+            out.append(self.regs[r])
+        return out
+
+
+class SimBMP180(SimDevice):
+
+    ADDRESS = 0x77
+    # datasheet example calibration
+    CALIBRATION = (408, -72, -14383, 32741, 32757, 23153, 6190, 4, -32768, -8711, 2868)
+    CONVERSION = {0x2E: 0.0045, 0x34: 0.0045, 0x74: 0.0075, 0xB4: 0.0135, 0xF4: 0.0255}
+
+    def __init__(self, board, temperature=25.0, sea_level=STANDARD_PRESSURE, noise=3.0) :
+        SimDevice.__init__(self, board)
+        self.temperature = temperature      # C
+        self.sea_level = sea_level          # hPa
+        self.sigma = noise                  # Pa
+        self.regs[0xD0] = 0x55              # chip id
+        out = []
+        for i, v in enumerate(self.CALIBRATION):
+            out.extend(_be(v))
+        self.regs[0xAA:0xAA + 22] = bytearray(out)
+        self._ready_at = 0.0
+
+    # forward model of the datasheet compensation, used to find the raw
+    # values that give the wanted temperature and pressure
+    def _b5(self, ut) :
+        ac1, ac2, ac3, ac4, ac5, ac6, b1, b2, mb, mc, md = self.CALIBRATION
+        x1 = ((ut - ac6) * ac5) >> 15
+        x2 = (mc << 11) // (x1 + md)
+        return x1 + x2
+
+    def _pressure(self, up, b5, oss) :
+        ac1, ac2, ac3, ac4, ac5, ac6, b1, b2, mb, mc, md = self.CALIBRATION
+        b6 = b5 - 4000
+        x3 = ((b2 * (b6 * b6 >> 12)) >> 11) + (ac2 * b6 >> 11)
+        b3 = (((ac1 * 4 + x3) << oss) + 2) >> 2
+        x3 = ((ac3 * b6 >> 13) + ((b1 * (b6 * b6 >> 12)) >> 16) + 2) >> 2
+        b4 = (ac4 * (x3 + 32768)) >> 15
+        p = ((up - b3) * (50000 >> oss) * 2) // b4
+        x1 = ((p >> 8) * (p >> 8) * 3038) >> 16
+        x2 = (-7357 * p) >> 16
+        return p + ((x1 + x2 + 3791) >> 4)
+
+    def _solve(self, f, target, lo, hi) :
+        # smallest raw value with f(raw) >= target (f is increasing)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if f(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _ut(self) :
+        target = int(round(self.temperature * 10))
+        # start at AC6 so x1 + MD never crosses zero during the search
+        return self._solve(lambda ut: (self._b5(ut) + 8) >> 4, target, self.CALIBRATION[5], 65535)
+
+    def pressure(self, t) :
+        # Pa at the current simulated altitude
+        h = self.board.motion.altitude(t)
+        return self.sea_level * 100.0 * (1.0 - h / 44330.0) ** 5.255
+
+    def write(self, reg, value) :
+        SimDevice.write(self, reg, value)
+        if reg != 0xF4:
+            return
+        t = self.board.now()
+        self._ready_at = t + self.CONVERSION.get(value, 0.0255)
+        ut = self._ut()
+        if value == 0x2E:
+            self.regs[0xF6:0xF8] = bytearray(_be(ut))
+            return
+        oss = value >> 6
+        b5 = self._b5(ut)
+        target = int(round(self.pressure(t) + self.noise(self.sigma)))
+        up = self._solve(lambda up: self._pressure(up, b5, oss), target, 0, (1 << (16 + oss)) - 1)
+        raw = up << (8 - oss)
+        self.regs[0xF6:0xF9] = bytearray([(raw >> 16) & 0xFF, (raw >> 8) & 0xFF, raw & 0xFF])
+
+    def read(self, reg, length) :
+        if reg == 0xF4:
+            # SCO bit stays set while the conversion runs
+            busy = self.board.now() < self._ready_at
+            self.regs[0xF4] = (self.regs[0xF4] | 0x20) if busy else (self.regs[0xF4] & ~0x20 & 0xFF)
+        return SimDevice.read(self, reg, length)
+
+
+# ---------------------------------------------------------------------------
+# buses
+
+class SimBus(object):
+    # smbus.SMBus look-alike in front of the simulated chips.
+    #
+    # latency:   seconds charged per transaction (e.g. 150e-6)
+    # byte_time: seconds charged per byte moved (about 90e-6 at 100 kHz)
+    # clock:     time source, seconds; time.monotonic by default. Pass a
+    #            function returning simulated time to run faster than real
+    #            time (the latency is then only added to the counters).
+
+    # calibration store backend (gy80.store.backend): simulated chips keep
+    # their data apart from the real ones
+    BACKEND = 'sim'
+
+    def __init__(self, motion=None, noise=True, latency=0.0, byte_time=0.0,
+                 seed=None, clock=None, devices=None) :
+        self.motion = motion if motion is not None else Motion()
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.byte_time = byte_time
+        self.clock = clock
+        self._t0 = time.monotonic()
+        self.transactions = 0
+        self.bytes = 0
+        self.bus_time = 0.0
+        if devices is None:
+            devices = [SimADXL345(self), SimL3G4200D(self), SimHMC5883L(self), SimBMP180(self)]
+            if not noise:
+                for d in devices:
+                    d.sigma = 0.0
+        self.devices = dict((d.ADDRESS, d) for d in devices)
+
+    def now(self) :
+        if self.clock is not None:
+            return self.clock()
+        return time.monotonic() - self._t0
+
+    def _device(self, address) :
+        try:
+            return self.devices[address]
+        except KeyError:
+            raise _nack(address)
+
+    def _charge(self, nbytes) :
+        cost = self.latency + nbytes * self.byte_time
+        self.transactions += 1
+        self.bytes += nbytes
+        self.bus_time += cost
+        if cost and self.clock is None:
+            _busy_wait(cost)
+
+    def read_byte_data(self, address, register) :
+        dev = self._device(address)
+        self._charge(1)
+        return dev.read(register, 1)[0]
+
+    def write_byte_data(self, address, register, value) :
+        dev = self._device(address)
+        self._charge(1)
+        dev.write(register, value)
+
+    def read_i2c_block_data(self, address, register, length=32) :
+        dev = self._device(address)
+        self._charge(length)
+        return dev.read(register, length)
+
+    def write_i2c_block_data(self, address, register, data) :
+        dev = self._device(address)
+        self._charge(len(data))
+        for i, value in enumerate(data):
+            dev.write(register + i, value)
+
+    def close(self) :
+        pass
+
+
+class TraceBus(object):
+    # Pass-through wrapper that records every transaction of `bus` as
+    # (op, address, register, data) with the time it happened.
+
+    def __init__(self, bus) :
+        self.bus = bus
+        self.trace = []
+        self._t0 = time.monotonic()
+
+    def _log(self, op, address, register, data) :
+        self.trace.append((time.monotonic() - self._t0, op, address, register, data))
+
+    def read_byte_data(self, address, register) :
+        value = self.bus.read_byte_data(address, register)
+        self._log('r', address, register, [value])
+        return value
+
+    def write_byte_data(self, address, register, value) :
+        self.bus.write_byte_data(address, register, value)
+        self._log('w', address, register, [value])
+
+    def read_i2c_block_data(self, address, register, length=32) :
+        data = list(self.bus.read_i2c_block_data(address, register, length))
+        self._log('r', address, register, data)
+        return data
+
+    def write_i2c_block_data(self, address, register, data) :
+        self.bus.write_i2c_block_data(address, register, data)
+        self._log('w', address, register, list(data))
+
+    def save(self, path) :
+        # one JSON list per line: [t, op, address, register, data]
+        with open(path, 'w') as f:
+            for entry in self.trace:
+                f.write(json.dumps(entry) + '\n')
+
+
+class ReplayBus(object):
+    # Plays back a TraceBus recording: each read of (address, register,
+    # length) returns the next recorded answer for it. Writes are accepted
+    # and ignored. With loop=True a read that ran out of recorded answers
+    # starts again from the first one; otherwise it raises IOError.
+
+    def __init__(self, trace, loop=True) :
+        if isinstance(trace, str):
+            with open(trace) as f:
+                trace = [json.loads(line) for line in f if line.strip()]
+        self.loop = loop
+        self._answers = collections.defaultdict(list)
+        for t, op, address, register, data in trace:
+            if op == 'r':
+                self._answers[(address, register, len(data))].append(list(data))
+        self._pos = collections.defaultdict(int)
+
+    def _next(self, address, register, length) :
+        key = (address, register, length)
+        answers = self._answers.get(key)
+        if not answers:
+            raise _nack(address)
+        i = self._pos[key]
+        if i >= len(answers):
+            if not self.loop:
+                raise IOError(EREMOTEIO, "trace exhausted for 0x%02x/0x%02x" % (address, register))
+            i = 0
+        self._pos[key] = i + 1
+        return answers[i]
+
+    def read_byte_data(self, address, register) :
+        return self._next(address, register, 1)[0]
+
+    def write_byte_data(self, address, register, value) :
+        pass
+
+    def read_i2c_block_data(self, address, register, length=32) :
+        return list(self._next(address, register, length))
+
+    def write_i2c_block_data(self, address, register, data) :
+        pass
+
+    def close(self) :
+        pass
@@ -0,0 +1,68 @@
+# Small JSON store for per-chip data that survives restarts
+# (BMP180 calibration words, magnetometer / accelerometer calibration, ...)
+#
+# One file per kind of data in CALIBRATION_DIR, each holding a dict keyed
+# by chip (bus number and I2C address). Chips on another backend than smbus
+# (the simulator) get keys of their own, so their data never ends up under
+# a real chip's key.
+
+import json
+import os
+
+CALIBRATION_DIR = os.environ.get('GY80_CALIBRATION_DIR',
+                                 os.path.join(os.path.expanduser('~'), '.gy80'))
+
+
+def backend(bus=None):
+    # backend behind bus and the wrappers around it (InstrumentedBus,
+    # LockedBus, ...): 'smbus' unless the innermost bus names another one
+    # in BACKEND, like gy80.sim.SimBus. Without a bus, GY80_BUS decides.
+    if bus is None:
+        return os.environ.get('GY80_BUS', 'smbus')
+    while hasattr(bus, 'bus'):
+        bus = bus.bus
+    return getattr(bus, 'BACKEND', 'smbus')
+
+
+def chip_key(name, address, bus=None):
+    from .bus import BUS_NUMBER
+    kind = backend(bus)
+    if kind == 'smbus':
+        return '%s@%d:0x%02x' % (name, BUS_NUMBER, address)
+    return '%s@%s:0x%02x' % (name, kind, address)
+
+
+def path(kind):
+    return os.path.join(CALIBRATION_DIR, kind + '.json')
+
+
+def load(kind):
+    try:
+        with open(path(kind), 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def save(kind, data):
+    # write to a temporary file first so a crash never leaves half a file
+    try:
+        if not os.path.isdir(CALIBRATION_DIR):
+            os.makedirs(CALIBRATION_DIR)
+        tmp = path(kind) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, path(kind))
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def get(kind, key):
+    return load(kind).get(key)
+
+
+def put(kind, key, value):
+    data = load(kind)
+    data[key] = value
+    return save(kind, data)
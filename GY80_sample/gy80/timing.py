@@ -0,0 +1,80 @@
+# Sample timestamps and loop jitter.
+#
+# A SampleClock stamps each multi-axis sample exactly once with
+# time.monotonic_ns() (never affected by NTP / wall clock steps) and hands
+# the same dt to every axis. It also keeps running statistics of the
+# interval between samples, so a loop can report when it falls behind:
+#
+#     clock = SampleClock(nominal_dt=0.01)
+#     while 1:
+#         xyz = gyro.getXYZ()
+#         dt = clock.tick()
+#         ...
+#     print(clock.stats())
+
+import time
+from math import sqrt
+
+
+class SampleClock(object):
+
+    def __init__(self, nominal_dt=None, late_factor=1.5) :
+        self.nominal_dt = nominal_dt
+        self.late_factor = late_factor
+        self.reset()
+
+    def reset(self) :
+        self.t_ns = None        # timestamp of the last sample
+        self.dt = 0.0           # interval before the last sample, s
+        self.count = 0          # number of intervals seen
+        self.late = 0           # intervals longer than late_factor * nominal_dt
+        self.min_dt = None
+        self.max_dt = None
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def tick(self, t_ns=None) :
+        # stamp one sample (now, or at t_ns e.g. from a FIFO sample clock)
+        # and return the interval since the previous one in seconds
+        if t_ns is None:
+            t_ns = time.monotonic_ns()
+        if self.t_ns is None:
+            self.t_ns = t_ns
+            self.dt = 0.0
+            return self.dt
+        dt = (t_ns - self.t_ns) * 1e-9
+        self.t_ns = t_ns
+        self.dt = dt
+
+        # running mean / variance (Welford)
+        self.count += 1
+        delta = dt - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (dt - self._mean)
+        if self.min_dt is None or dt < self.min_dt:
+            self.min_dt = dt
+        if self.max_dt is None or dt > self.max_dt:
+            self.max_dt = dt
+        if self.nominal_dt is not None and dt > self.late_factor * self.nominal_dt:
+            self.late += 1
+        return dt
+
+    def mean_dt(self) :
+        return self._mean
+
+    def jitter(self) :
+        # standard deviation of the sample interval, s
+        if self.count < 2:
+            return 0.0
+        return sqrt(self._m2 / (self.count - 1))
+
+    def stats(self) :
+        return {
+            'count': self.count,
+            'mean_dt': self._mean,
+            'jitter': self.jitter(),
+            'min_dt': self.min_dt,
+            'max_dt': self.max_dt,
+            'late': self.late,
+            'rate': 1.0 / self._mean if self._mean > 0 else 0.0,
+        }
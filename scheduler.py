@@ -0,0 +1,22 @@
+# PeriodicScheduler for the scripts at the top of the repository
+# (temperature.py, ultrasonic.py, ...):
+#
+#     from scheduler import PeriodicScheduler
+#
+# The one implementation lives in GY80_sample/gy80/scheduler.py, which
+# does not depend on the rest of the gy80 package. It is loaded from
+# there by file name, so these scripts need no sys.path changes and do
+# not import the driver package at all.
+
+import importlib.util
+import os
+
+_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GY80_sample', 'gy80', 'scheduler.py')
+
+_spec = importlib.util.spec_from_file_location('_gy80_scheduler', _PATH)
+_scheduler = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_scheduler)
+
+PeriodicScheduler = _scheduler.PeriodicScheduler
+set_realtime = _scheduler.set_realtime
+LATE_BINS_US = _scheduler.LATE_BINS_US
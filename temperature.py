@@ -1,8 +1,9 @@
 import RPi.GPIO as GPIO
 import dht11
-import time
 import datetime
 
+from scheduler import PeriodicScheduler
+
 LED_PIN = 23
 
 # initialize GPIO
@@ -13,8 +14,11 @@ GPIO.setup(LED_PIN, GPIO.OUT)
 # read data using pin 
 instance = dht11.DHT11(pin=17)
 
+# the DHT11 needs about 1 s between reads
+loop = PeriodicScheduler(rate=1)
+
 try:
-    while True:
+    for tick in loop:
         result = instance.read()
         if result.is_valid():
             print("Last valid input: " + str(datetime.datetime.now()))
@@ -24,12 +28,12 @@ try:
 
         if result.temperature > 25:
             GPIO.output(LED_PIN, GPIO.HIGH)
-            time.sleep(1)
         else:
             GPIO.output(LED_PIN, GPIO.LOW)
 
 except KeyboardInterrupt:
     print("Cleanup")
+    print(loop.report())
 
 finally:
     GPIO.cleanup()
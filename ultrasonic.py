@@ -1,6 +1,9 @@
 import RPi.GPIO as GPIO
+import threading
 import time
 
+from scheduler import PeriodicScheduler
+
 TRIGGER_PIN = 16
 ECHO_PIN = 18
 LED_PIN = 22
@@ -36,22 +39,44 @@ def measure():
 
     return d*100
 
-while True:
-    distance = measure()
-    print distance
+# LED half period (s) for a distance (cm); None keeps the LED off
+def blink_period(distance):
     if distance < 30:
-        for i in range(2):
-            GPIO.output(LED_PIN, GPIO.HIGH)
-            time.sleep(0.1)
-            GPIO.output(LED_PIN, GPIO.LOW)
-            time.sleep(0.1)
+        return 0.1
     elif distance < 100 and distance >= 30:
-        for i in range(2):
-            GPIO.output(LED_PIN, GPIO.HIGH)
-            time.sleep(0.3)
+        return 0.3
+    return None
+
+# The LED blinks in its own thread from the latest distance, so the
+# blinking (up to 1.2 s per pattern) never delays the next measurement.
+period = None
+done = threading.Event()
+
+def led():
+    while not done.is_set():
+        p = period
+        if p is None:
             GPIO.output(LED_PIN, GPIO.LOW)
-            time.sleep(0.3)
-    else:
+            done.wait(0.05)
+            continue
+        GPIO.output(LED_PIN, GPIO.HIGH)
+        done.wait(p)
         GPIO.output(LED_PIN, GPIO.LOW)
+        done.wait(p)
+
+blinker = threading.Thread(target=led, name='led')
+blinker.daemon = True
+blinker.start()
+
+# the HC-SR04 wants ~60 ms between pings
+loop = PeriodicScheduler(rate=10)
 
-GPIO.cleanup()
+try:
+    for tick in loop:
+        distance = measure()
+        print(distance)
+        period = blink_period(distance)
+finally:
+    done.set()
+    blinker.join()
+    GPIO.cleanup()